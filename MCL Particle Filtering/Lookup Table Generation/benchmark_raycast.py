@@ -0,0 +1,54 @@
+"""Benchmark the ray casting backends against each other.
+
+Casts 360-beam scans from random free positions with every backend in
+lidar_raycast and reports the time per scan and the error relative to the
+analytic ray/box caster, which is exact at any ppi.
+
+Usage: python benchmark_raycast.py [num_poses]
+"""
+import sys
+import math
+import time
+import numpy as np
+import lidar_lookup_helper as mh
+from lidar_raycast import cast_scan, RAY_CASTERS
+
+PPI_LEVELS = (5, 12)
+SEED = 0
+
+
+def random_poses(base_grid, num_poses, rng):
+    """Random continuous positions (in inches) inside free cells."""
+    free = np.argwhere(base_grid == 0)
+    cells = free[rng.integers(len(free), size=num_poses)]
+    return cells[:, 1] + rng.random(num_poses), cells[:, 0] + rng.random(num_poses)
+
+
+def main(num_poses=200):
+    rng = np.random.default_rng(SEED)
+    base_grid = mh.init_grid()
+    x_in, y_in = random_poses(base_grid, num_poses, rng)
+    scan_angles = np.linspace(0, 359, 360) * (math.pi / 180)
+
+    for ppi in PPI_LEVELS:
+        grid = mh.expand_grid(base_grid, ppi)
+        print(f"ppi = {ppi}, {num_poses} poses x {scan_angles.size} beams")
+        results = {}
+        for backend in RAY_CASTERS:
+            scene = mh.OBSTACLE_BOXES if backend == "analytic" else grid
+            start = time.perf_counter()
+            results[backend] = cast_scan(scene, x_in * ppi, y_in * ppi, scan_angles, ppi, backend=backend)
+            elapsed = time.perf_counter() - start
+            print(f"  {backend:>8}: {1000 * elapsed / num_poses:8.3f} ms/scan")
+
+        reference = results["analytic"]
+        for backend, ranges in results.items():
+            if backend == "analytic":
+                continue
+            error = np.abs(ranges - reference)
+            print(f"  {backend:>8} vs analytic: mean {error.mean():.3f} in, "
+                  f"p99 {np.percentile(error, 99):.3f} in, max {error.max():.3f} in")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,51 @@
+"""Benchmark the sweep table builder against casting every cell.
+
+Builds every angle of the table with `sweep_ranges` over all valid cells,
+casts a random sample of cells with the ray casting backends, and reports
+the time per full table and the sweep's error against each backend on the
+sampled cells.
+
+Usage: python benchmark_sweep.py [num_cells]
+"""
+import sys
+import time
+import numpy as np
+import lidar_lookup_helper as mh
+from lidar_raycast import cast_scan, sweep_ranges
+from lidar_lookup_generator import table_angles
+
+PPI_LEVELS = (5, 12)
+BACKENDS = ("march", "dda")
+SEED = 0
+
+
+def main(num_cells=2000):
+    rng = np.random.default_rng(SEED)
+    scan_angles = table_angles()
+
+    for ppi in PPI_LEVELS:
+        grid = mh.expand_grid(mh.init_grid(), ppi)
+        ys, xs = np.nonzero(grid == 0)
+        sample = rng.choice(xs.size, size=min(num_cells, xs.size), replace=False)
+        print(f"ppi = {ppi}, {xs.size} cells x {scan_angles.size} angles")
+
+        # The sweep always covers the whole grid, keep only the sampled cells
+        swept = np.empty((sample.size, scan_angles.size))
+        start = time.perf_counter()
+        for angle, beam_angle in enumerate(scan_angles):
+            swept[:, angle] = sweep_ranges(grid, xs, ys, beam_angle, ppi)[sample]
+        elapsed = time.perf_counter() - start
+        print(f"  {'sweep':>8}: {elapsed:8.1f} s per table")
+
+        for backend in BACKENDS:
+            start = time.perf_counter()
+            ranges = cast_scan(grid, xs[sample], ys[sample], scan_angles, ppi, backend=backend)
+            elapsed = (time.perf_counter() - start) * xs.size / sample.size
+            error = np.abs(swept - ranges)
+            print(f"  {backend:>8}: {elapsed:8.1f} s per table (from {sample.size} cells), sweep error: "
+                  f"mean {error.mean():.3f} in, p99 {np.percentile(error, 99):.3f} in, "
+                  f"{100 * np.mean(error > 0.1):.3f}% of beams over 0.1 in")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
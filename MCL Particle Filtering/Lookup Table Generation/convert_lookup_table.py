@@ -0,0 +1,88 @@
+"""Convert an existing lidar lookup table (.npz or .pkl) to a faster format.
+
+The output format follows the destination suffix: .lut writes the
+memory-mappable container from lidar_table (dense float32 or compact),
+.npz writes a compact table. With --beam-width the output is the derived
+cone table of a beam that many degrees wide instead of single rays.
+Tables without metadata (older .npz and .pkl files) keep none; their output
+name must then state the beam width it holds (see legacy_beam_width).
+
+Usage:
+    python convert_lookup_table.py lidar_lookup_v2.npz lidar_lookup_v2.lut --dtype float32
+    python convert_lookup_table.py lidar_lookup_v3.npz lidar_lookup_v3_compact.npz --dtype uint8
+    python convert_lookup_table.py lidar_lookup_v2.npz lidar_lookup_v2_15_beam_angle.lut --beam-width 15
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+import numpy as np
+# Modules shared by both directories live in ../shared
+SHARED_DIR = str(Path(__file__).resolve().parent.parent / "shared")
+if SHARED_DIR not in sys.path:
+    sys.path.insert(0, SHARED_DIR)
+from lidar_table import (CompactLookup, DenseLookup, QUANTIZED_DTYPES, beam_bins, cone_ranges, cone_table,
+                         legacy_beam_width, load_dense_array, load_lookup, read_metadata, save_table)
+
+
+def main(src, dst, dtype, beam_width=1):
+    table = load_dense_array(src)
+    metadata = read_metadata(src)
+    source_width = metadata.get("beam_width", 1) if metadata is not None else legacy_beam_width(src)
+    if beam_width > 1 and source_width not in (None, 1):
+        raise ValueError(f"{src} already holds {source_width:g} degree beams, cone tables need single rays")
+    if metadata is None:
+        # Without metadata only the name records the beam width, so it must state the one written
+        width = beam_width if beam_width > 1 else source_width
+        named = legacy_beam_width(dst)
+        if named != width and not (named is None and width in (None, 1)):
+            stated = "no beam width" if named is None else f"{named:g} degree beams"
+            raise ValueError(f"{src} has no metadata, so {dst} would only record its beam width in its name, "
+                             f"which states {stated} instead of {width or 1:g}; "
+                             f"name it like *_{width or 1:g}_beam_angle{Path(dst).suffix}")
+    if dtype == "float32":
+        lookup = DenseLookup(np.asarray(table, dtype=np.float32))
+    else:
+        lookup = CompactLookup.from_dense(table, dtype)
+    if beam_width > 1:
+        # Quantization is monotonic, so the window minimum of a compact table is exact
+        lookup = cone_table(lookup, beam_width)
+        if metadata is not None:
+            metadata = dict(metadata, beam_width=beam_width)
+
+    # Keep the source's metadata so the converted table is still recognised
+    if Path(dst).suffix == ".lut":
+        save_table(dst, lookup, None if metadata is None else {"metadata": metadata})
+    elif isinstance(lookup, CompactLookup):
+        lookup.save(dst, metadata)
+    else:
+        raise ValueError("float32 tables are only converted to .lut files")
+
+    # Read the result back and check the worst error over the visited cells, column by column
+    written = load_lookup(dst)
+    angles = np.arange(table.shape[2])
+    bins = beam_bins(beam_width, table.shape[2])
+    max_error = 0.0
+    for x in range(table.shape[0]):
+        column = np.asarray(table[x])
+        ys = np.flatnonzero(np.any(column != 0, axis=1))
+        if ys.size:
+            error = np.abs(written.lookup(x, ys[:, None], angles) - cone_ranges(column[ys], bins))
+            max_error = max(max_error, float(error.max()))
+
+    print(f"Wrote {dst} ({dtype}, {beam_width} degree beams)")
+    print(f"In memory: {table.nbytes / 1e6:.1f} MB -> {written.nbytes / 1e6:.1f} MB")
+    print(f"On disk: {os.path.getsize(src) / 1e6:.1f} MB -> {os.path.getsize(dst) / 1e6:.1f} MB")
+    print(f"Max conversion error: {max_error:.3f} in")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a lidar lookup table to the compact or .lut format.")
+    parser.add_argument("src", help="dense table (.npz from the generator, .pkl or .lut)")
+    parser.add_argument("dst", help="output .lut (memory-mapped) or .npz (compact)")
+    parser.add_argument("--dtype", default="uint8", choices=("float32",) + QUANTIZED_DTYPES,
+                        help="float32 keeps the dense table, uint8/uint16 store a compact table")
+    parser.add_argument("--beam-width", type=float, default=1,
+                        help="derive the table of beams this many degrees wide (shortest range in the beam)")
+    args = parser.parse_args()
+    main(args.src, args.dst, args.dtype, args.beam_width)
@@ -1,12 +1,16 @@
+import argparse
+import json
+import os
+import time
 import pygame
 import math
 import copy
 import numpy as np
+from multiprocessing import Pool
 import lidar_lookup_helper as mh
 from lidar_lookup_helper import Rover
-
-# Initialize pygame
-pygame.init()
+from lidar_raycast import cast_scan, sweep_ranges, RAY_CASTERS
+from lidar_table import CompactLookup, LookupPyramid, save_table, table_metadata
 
 # Constants (some are same as mcl_helper.py, will clean up in future)
 GRID_WIDTH = 96 + 2 # inches (one extra inch on each side for border)
@@ -27,182 +31,371 @@ NUM_PARTICLES = mh.NUM_PARTICLES
 FORWARD_VELOCITY = 4 * ppi  # inches per second
 ANGULAR_VELOCITY = math.radians(1)  # 120 degrees per second
 
-    
-grid = mh.init_grid()
-reduced_grid = copy.deepcopy(grid)
-grid = mh.expand_grid(grid, ppi)
-valid_positions = mh.create_valid_positions(grid)
-print(len(valid_positions))
-# Create a fast membership set of valid positions as tuples (x,y)
-valid_position_set = set((p[0], p[1]) for p in valid_positions)
-
-
-# Initialize rover and particles
-rover = Rover(grid, valid_positions)
-#particles = [Particle(grid, valid_positions) for _ in range(NUM_PARTICLES)]
-#pred_x, pred_y, pred_theta = mh.estimate(particles)
-
-#print(rover.lidar_scan(grid).size)
-
-# Initialize window
-print(len(grid[0]))
-print(len(grid))
-
-window = pygame.display.set_mode((len(grid[0]), len(grid)))
-pygame.display.set_caption("Rover Simulation with Edges as Obstacles")
-
-#angle_table = np.arange(0, 360, 1) * math.pi / 180.0  # 0 to 359 degrees in radians
-
-# Main loop
-running = True
-clock = pygame.time.Clock()
-
-
-# === Initialize rover and lookup ===
-rover = Rover(grid, valid_positions)
-lidar_lookup = np.memmap(
-    "lidar_lookup_fast.dat",
-    dtype=np.float32, mode="w+",
-    shape=(len(grid[0]), len(grid), 360)
-)
-print(len(valid_positions))
-
-step = 1  # Adjust step size for faster data collection
-while running:
-    '''
-    1. Spawn the rover in a valid position -> do so using the helper function
-    2. At each location record the distances of all sensors, save as [x,y,angle of robot = 0-360] where [x][y][angle] = [72 points of distances]
-    step by step make it move and record data at all angles
-    '''
-    for x in range(0, len(grid[0]), step):
-        for y in range(0, len(grid), step):
-            # Check the candidate (x,y) against the set of valid positions.
-            # Note: valid_positions contains lists [x,y], so testing a tuple (x,y)
-            # against that list would always fail; use the set of tuples instead.
-            if (x, y) not in valid_position_set:
-                print(f"Skipping invalid position: ({x}, {y})")
-                continue
-            rover.x = x
-            rover.y = y
-            
-            # call the scan and store 360 distances into memmap
-            scan = rover.lidar_scan(grid)  # expected: list/array length 360
-            print(f"Collecting data at position ({x}, {y}) -> scan length: {np.size(scan)}")
-            # Ensure scan is a numpy array with correct dtype and length
-            scan = np.asarray(scan, dtype=np.float32)
-            if scan.size != 360:
-                # Defensive: if scan is empty or wrong length, fill with max readings
-                print(f"Warning: scan at ({x},{y}) returned size {scan.size}; filling with MAX_SENSOR_READING")
-                scan = np.full((360,), float(MAX_SENSOR_READING), dtype=np.float32)
-            lidar_lookup[x, y, :] = scan
-            
-            if y % 10 == 0:
-                # Draw rover as a square and its orientation
-                rover_pos = (int(rover.x), int(rover.y))
-                rover_rect = pygame.Rect(rover_pos[0] - ppi, rover_pos[1] - ppi, 2 * ppi, 2 * ppi)  # Rover as a larger square
-                
-                mh.draw_grid(window, reduced_grid)
-                pygame.draw.rect(window, BLACK, rover_rect)  # Draw rover in black
-                mh.draw_orientation(window, rover_pos[0], rover_pos[1], rover.theta, length=ppi, color=GREEN)
-                
-                pygame.display.flip()
-                clock.tick(240)  # 60 FPS
-    # Save the lidar lookup table
-    import os
-    print("Current working directory:", os.getcwd())
+# Lookup table generation
+NUM_ANGLES = 360  # one beam per degree, table is [x][y][angle]
+LOOKUP_DAT_FILE = "lidar_lookup_fast.dat"
+LOOKUP_CHECKPOINT_FILE = LOOKUP_DAT_FILE + ".progress.json"  # tiles of LOOKUP_DAT_FILE already cast
+LOOKUP_NPZ_FILE = "lidar_lookup_v3.npz"
+LOOKUP_PYRAMID_FILE = "lidar_lookup_pyramid.lut"
+PYRAMID_LEVELS = (1, 4, 12)  # pixels per inch of each pyramid level, each must divide ppi
+PYRAMID_DTYPE = "uint16"  # pyramid levels are stored as compact tables
+TILE_WIDTH = 8  # columns per tile; tiles are the unit of work and of checkpointing
+BUILDERS = ("cast", "sweep")  # cast every cell's rays, or propagate along each beam angle
+PROGRESS_INTERVAL = 5.0  # seconds between progress reports
+
+
+def build_grid():
+    """Return the expanded grid and the inch-resolution grid used for drawing."""
+    reduced_grid = mh.init_grid()
+    grid = mh.expand_grid(copy.deepcopy(reduced_grid), ppi)
+    return grid, reduced_grid
+
+
+def column_cells(grid, x, step=1):
+    """Valid (grid == 0) y coordinates of column x, sampled every `step` pixels."""
+    return np.flatnonzero(grid[::step, x] == 0) * step
+
+
+def table_angles():
+    """Beam angle of every table angle bin, in radians."""
+    return np.linspace(0, NUM_ANGLES - 1, NUM_ANGLES) * (math.pi / 180)
+
+
+def scan_column(grid, x, ys, backend):
+    """Cast all NUM_ANGLES beams for every cell (x, y) in ys in one batched call."""
+    scan_angles = table_angles()
+    scene = mh.OBSTACLE_BOXES if backend == "analytic" else grid
+    return cast_scan(scene, x, ys, scan_angles, ppi, backend=backend).astype(np.float32)
+
+
+class ProgressReporter:
+    """Prints cells done and cells/second at most every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, total_cells, interval=PROGRESS_INTERVAL, unit="cells"):
+        self.total_cells = total_cells
+        self.interval = interval
+        self.unit = unit
+        self.done_cells = 0
+        self.reported_cells = None
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def update(self, cells, force=False):
+        self.done_cells += cells
+        now = time.perf_counter()
+        if (force and self.reported_cells != self.done_cells) or now - self.last_report >= self.interval:
+            self.last_report = now
+            self.reported_cells = self.done_cells
+            elapsed = max(now - self.start, 1e-9)
+            percent = 100.0 * self.done_cells / max(self.total_cells, 1)
+            print(f"{self.done_cells}/{self.total_cells} {self.unit} ({percent:.1f}%), "
+                  f"{self.done_cells / elapsed:.0f} {self.unit}/s, {elapsed:.0f} s elapsed")
+
+
+def open_lookup(path, grid, mode):
+    return np.memmap(path, dtype=np.float32, mode=mode, shape=(len(grid[0]), len(grid), NUM_ANGLES))
+
+
+def num_tiles(grid):
+    return -(-len(grid[0]) // TILE_WIDTH)
+
+
+def tile_columns(tile, grid, step):
+    """x coordinates of a tile (TILE_WIDTH wide column band) sampled every `step`."""
+    first = tile * TILE_WIDTH
+    return [x for x in range(first, min(first + TILE_WIDTH, len(grid[0]))) if x % step == 0]
+
+
+def count_cells(grid, tiles, step):
+    return sum(column_cells(grid, x, step).size for tile in tiles for x in tile_columns(tile, grid, step))
+
+
+def build_tile(lidar_lookup, grid, tile, step, backend, on_column=None):
+    """Cast every valid cell of one tile into lidar_lookup and flush it to disk.
+
+    Returns:
+        int: Number of cells written.
+    """
+    cells = 0
+    for x in tile_columns(tile, grid, step):
+        ys = column_cells(grid, x, step)
+        if ys.size == 0:
+            continue
+        lidar_lookup[x, ys, :] = scan_column(grid, x, ys, backend)
+        cells += ys.size
+        if on_column is not None:
+            on_column(x, ys)
+    lidar_lookup.flush()
+    return cells
+
+
+class BuildCheckpoint:
+    """Records which tiles of a table build are complete, in a JSON file.
+
+    The file also stores the build parameters so a checkpoint is only resumed
+    by a build that would produce the same table.
+    """
+
+    def __init__(self, path, params):
+        self.path = path
+        self.params = params
+        self.done = set()
+
+    def load(self):
+        """Load completed tiles; returns False if there is no matching checkpoint."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get("params") != self.params:
+            return False
+        self.done = set(state["done"])
+        return True
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"params": self.params, "done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+    def mark_done(self, tile):
+        self.done.add(tile)
+        self.save()
+
+
+def build_serial(lidar_lookup, grid, tiles, step, backend, on_tile=None, on_column=None,
+                 progress_interval=PROGRESS_INTERVAL):
+    """Fill lidar_lookup tile by tile in this process.
+
+    Args:
+        lidar_lookup (np.memmap): Output table indexed [x][y][angle].
+        grid (np.array): Expanded grid.
+        tiles (list): Tile indices to build.
+        step (int): Sampling step in pixels along both axes.
+        backend (str): Ray casting backend passed to cast_scan.
+        on_tile (callable, optional): Called as on_tile(tile) once a tile is on disk.
+        on_column (callable, optional): Called as on_column(x, ys) after each column.
+        progress_interval (float): Seconds between progress reports.
+    """
+    progress = ProgressReporter(count_cells(grid, tiles, step), progress_interval)
+    for tile in tiles:
+        progress.update(build_tile(lidar_lookup, grid, tile, step, backend, on_column))
+        if on_tile is not None:
+            on_tile(tile)
+    progress.update(0, force=True)
+
+
+# Per-process state of the parallel workers, set by _init_worker
+_worker = {}
 
-    np.savez_compressed("lidar_lookup_v3.npz", lidar_lookup=lidar_lookup)
-    
+
+def _init_worker(path, backend, step):
+    grid, _ = build_grid()
+    _worker["grid"] = grid
+    _worker["lookup"] = open_lookup(path, grid, "r+")
+    _worker["backend"] = backend
+    _worker["step"] = step
+
+
+def _build_tile(tile):
+    """Worker task: cast one tile straight into the shared memmap."""
+    cells = build_tile(_worker["lookup"], _worker["grid"], tile, _worker["step"], _worker["backend"])
+    return tile, cells
+
+
+def build_parallel(path, grid, tiles, step, backend, workers, on_tile=None,
+                   progress_interval=PROGRESS_INTERVAL):
+    """Fill the memmap at `path` using a pool of `workers` processes.
+
+    Every worker writes its tiles directly into the shared file and flushes
+    them before reporting back, so nothing is sent back but the tile index
+    and cell count. Each tile is computed by the same `build_tile` call as in
+    `build_serial`, so the output is bit-identical.
+    """
+    progress = ProgressReporter(count_cells(grid, tiles, step), progress_interval)
+    with Pool(workers, initializer=_init_worker, initargs=(path, backend, step)) as pool:
+        for tile, cells in pool.imap_unordered(_build_tile, tiles):
+            progress.update(cells)
+            if on_tile is not None:
+                on_tile(tile)
+    progress.update(0, force=True)
+
+
+def build_sweep(lidar_lookup, grid, step, progress_interval=PROGRESS_INTERVAL):
+    """Fill lidar_lookup one angle at a time with `sweep_ranges`.
+
+    Each angle costs one pass over the grid whatever the ray lengths, so the
+    whole table is built far faster than by casting every cell. It matches
+    the "dda" backend except for beams clipping an obstacle corner by less
+    than a pixel (about 1 in 10000 beams at ppi=12).
+    """
+    ys, xs = np.nonzero(grid[::step, ::step] == 0)
+    xs, ys = xs * step, ys * step
+    progress = ProgressReporter(NUM_ANGLES, progress_interval, unit="angles")
+    for angle, beam_angle in enumerate(table_angles()):
+        lidar_lookup[xs, ys, angle] = sweep_ranges(grid, xs, ys, beam_angle, ppi)
+        progress.update(1)
+    lidar_lookup.flush()
+    progress.update(0, force=True)
+
+
+def save_compressed(grid, metadata):
+    """Write the finished table in LOOKUP_DAT_FILE to LOOKUP_NPZ_FILE with its metadata."""
+    print("Current working directory:", os.getcwd())
+    lidar_lookup = open_lookup(LOOKUP_DAT_FILE, grid, "r")
+    np.savez_compressed(LOOKUP_NPZ_FILE, lidar_lookup=lidar_lookup, metadata=json.dumps(metadata))
     print("Lidar lookup table saved successfully.")
-    
-    pygame.quit()
-    running = False
-    clock.tick(240)  # 60 FPS
-                
-    
-    '''
-    for i in range(0, len(valid_positions), 450):
-        rover.x = valid_positions[i][0]
-        rover.y = valid_positions[i][1]
-        
-        for posAngle in range(360):
-            lidar_lookup[rover.x][rover.y][posAngle, :] = rover.lidar_scan(grid)
-            rover.theta = angle_table[posAngle]
-            
-            print(f"Collecting data at position {i}, angle {posAngle}")
-            if posAngle % 135 == 0:
-                # Draw rover as a square and its orientation
-                rover_pos = (int(rover.x), int(rover.y))
-                rover_rect = pygame.Rect(rover_pos[0] - ppi, rover_pos[1] - ppi, 2 * ppi, 2 * ppi)  # Rover as a larger square
-                
-                mh.draw_grid(window, reduced_grid)
-                pygame.draw.rect(window, BLACK, rover_rect)  # Draw rover in black
-                mh.draw_orientation(window, rover_pos[0], rover_pos[1], rover.theta, length=ppi, color=GREEN)
-            
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
+
+
+def save_pyramid(grid, levels, metadata, step=1):
+    """Write LOOKUP_PYRAMID_FILE from the finished table in LOOKUP_DAT_FILE.
+
+    The cells of a level with L pixels per inch are every (ppi // L)-th cell
+    of the full table along both axes, so every level comes from the same
+    generation pass without casting again.
+    """
+    for level in levels:
+        if ppi % level or (ppi // level) % step:
+            raise ValueError(f"pyramid level {level} ppi does not divide ppi={ppi} in steps of {step}")
+    lidar_lookup = open_lookup(LOOKUP_DAT_FILE, grid, "r")
+    pyramid = LookupPyramid({level: CompactLookup.from_dense(lidar_lookup[::ppi // level, ::ppi // level],
+                                                             PYRAMID_DTYPE)
+                             for level in levels})
+    save_table(LOOKUP_PYRAMID_FILE, pyramid, {"metadata": metadata})
+    sizes = ", ".join(f"{level} ppi {table.nbytes / 1e6:.1f} MB" for level, table in pyramid.levels.items())
+    print(f"Lookup table pyramid saved to {LOOKUP_PYRAMID_FILE} ({sizes})")
+
+
+def main(workers=1, backend=mh.RAYCAST_BACKEND, step=1, resume=False, tiles=None,
+         headless=False, progress_interval=PROGRESS_INTERVAL, builder="cast", pyramid=None):
+    """Build the lookup table, or the tiles in range(*tiles) of it.
+
+    With `resume`, tiles recorded as complete in the checkpoint next to
+    LOOKUP_DAT_FILE are kept and only the missing ones are computed.
+    `tiles` implies `resume`, so a table can be built in pieces. The
+    compressed table is only written once every tile is complete.
+    Parallel and `headless` builds open no window and are not frame-rate
+    limited; progress is printed every `progress_interval` seconds.
+
+    The "sweep" builder builds the whole table in one pass per angle, so it
+    ignores `workers`, `backend`, `resume`, `tiles` and `headless`. With
+    `pyramid` (levels in pixels per inch) the finished table is also saved
+    as a multi-resolution pyramid.
+    """
+    grid, reduced_grid = build_grid()
+    print(f"Grid: {len(grid[0])} x {len(grid)}, {int(np.count_nonzero(grid == 0))} valid positions")
+    # Stored with the outputs so loaders can tell which maze and parameters they were built for
+    metadata = dict(table_metadata(reduced_grid, ppi, NUM_ANGLES), builder=builder, backend=backend, step=step)
+
+    if builder == "sweep":
+        print(f"Building all {NUM_ANGLES} angles by propagation along the beams")
+        lidar_lookup = open_lookup(LOOKUP_DAT_FILE, grid, "w+")
+        # The cast tiles recorded for the old contents are gone, a later --resume must not trust them
+        if os.path.exists(LOOKUP_CHECKPOINT_FILE):
+            os.remove(LOOKUP_CHECKPOINT_FILE)
+        build_sweep(lidar_lookup, grid, step, progress_interval)
+        save_compressed(grid, metadata)
+        if pyramid:
+            save_pyramid(grid, pyramid, metadata, step)
+        return
+
+    params = {"shape": [len(grid[0]), len(grid), NUM_ANGLES], "ppi": ppi, "step": step,
+              "backend": backend, "tile_width": TILE_WIDTH}
+    checkpoint = BuildCheckpoint(LOOKUP_CHECKPOINT_FILE, params)
+    # A subset of tiles adds to the table, reopening it with "w+" would drop the tiles of earlier runs
+    resume = resume or tiles is not None
+    if resume and os.path.exists(LOOKUP_DAT_FILE) and checkpoint.load():
+        print(f"Resuming build: {len(checkpoint.done)}/{num_tiles(grid)} tiles already complete")
+        lidar_lookup = open_lookup(LOOKUP_DAT_FILE, grid, "r+")
+    else:
+        if resume:
+            print("No matching checkpoint found, starting a new build")
+        # Allocate (and zero) the output before any worker opens it
+        lidar_lookup = open_lookup(LOOKUP_DAT_FILE, grid, "w+")
+        lidar_lookup.flush()
+        checkpoint.save()
+
+    selected = range(num_tiles(grid)) if tiles is None else range(*tiles)
+    todo = [tile for tile in selected if tile not in checkpoint.done]
+    print(f"Building {len(todo)} tiles of {TILE_WIDTH} columns ({backend} backend)")
+
+    if workers > 1:
+        print(f"Using {workers} workers")
+        build_parallel(LOOKUP_DAT_FILE, grid, todo, step, backend, workers,
+                       on_tile=checkpoint.mark_done, progress_interval=progress_interval)
+    elif headless:
+        build_serial(lidar_lookup, grid, todo, step, backend,
+                     on_tile=checkpoint.mark_done, progress_interval=progress_interval)
+    else:
+        # Initialize pygame and show the rover at the last cell of each column
+        pygame.init()
+        window = pygame.display.set_mode((len(grid[0]), len(grid)))
+        pygame.display.set_caption("Rover Simulation with Edges as Obstacles")
+        clock = pygame.time.Clock()
+        # draw_column moves the rover to each column as it is cast, so it starts on the first free cell
+        first_y, first_x = np.unravel_index(np.argmax(grid == 0), grid.shape)
+        rover = Rover(grid, [(first_x, first_y)])
+
+        def draw_column(x, ys):
+            rover.x = x
+            rover.y = int(ys[-1])
+            rover_pos = (int(rover.x), int(rover.y))
+            rover_rect = pygame.Rect(rover_pos[0] - ppi, rover_pos[1] - ppi, 2 * ppi, 2 * ppi)  # Rover as a larger square
+
+            mh.draw_grid(window, reduced_grid)
+            pygame.draw.rect(window, BLACK, rover_rect)  # Draw rover in black
+            mh.draw_orientation(window, rover_pos[0], rover_pos[1], rover.theta, length=ppi, color=GREEN)
 
             pygame.display.flip()
             clock.tick(240)  # 60 FPS
-            
+
+        build_serial(lidar_lookup, grid, todo, step, backend, on_tile=checkpoint.mark_done,
+                     on_column=draw_column, progress_interval=progress_interval)
+        pygame.quit()
+
+    missing = num_tiles(grid) - len(checkpoint.done)
+    if missing:
+        print(f"{missing} tiles still missing, rerun with --resume to complete the table")
+        return
+
     # Save the lidar lookup table
-    import os
-    print("Current working directory:", os.getcwd())
-    print("Saving lookup table to:", os.path.abspath("lidar_lookup_fast.npz"))
-
-    np.savez_compressed("lidar_lookup_fast.npz", lidar_lookup=lidar_lookup)
-    
-    running = False
-    pygame.quit()
-    '''
-    '''
-    window.fill(WHITE)
-    mh.draw_grid(window, reduced_grid)
-        
-    # User input for rover control
-    keys = pygame.key.get_pressed()
-    if keys[pygame.K_w]:
-        rover.vel_forward = FORWARD_VELOCITY
-    elif keys[pygame.K_s]:
-        rover.vel_forward = -FORWARD_VELOCITY
-    else:
-        rover.vel_forward = 0
+    save_compressed(grid, metadata)
+    if pyramid:
+        save_pyramid(grid, pyramid, metadata, step)
 
-    if keys[pygame.K_a]:
-        rover.vel_angular = -ANGULAR_VELOCITY
-    elif keys[pygame.K_d]:
-        rover.vel_angular = ANGULAR_VELOCITY
-    else:
-        rover.vel_angular = 0
-
-    # Move rover and particles
-    dt = clock.get_time() / 1000  # Time in seconds
-    rover.move(dt, grid)
-    #mh.update_particles(particles, rover, dt, grid)  # Pass dt to particles
-
-    # Draw particles with orientation lines
-    for particle in particles:
-        particle_pos = (int(particle.x), int(particle.y))
-        pygame.draw.circle(window, RED, particle_pos, ppi / 2)
-        mh.draw_orientation(window, particle_pos[0], particle_pos[1], particle.theta, length=ppi * 2, color=RED)
-    # Draw rover as a square and its orientation
-    rover_pos = (int(rover.x), int(rover.y))
-    rover_rect = pygame.Rect(rover_pos[0] - ppi, rover_pos[1] - ppi, 2 * ppi, 2 * ppi)  # Rover as a larger square
-    pygame.draw.rect(window, BLACK, rover_rect)  # Draw rover in black
-    mh.draw_orientation(window, rover_pos[0], rover_pos[1], rover.theta, length=ppi, color=GREEN)
-
-    # Lidar scan for the rover and draw points
-    lidar_distances = rover.lidar_scan(grid)
-    # particle_lidar_distances = []
-
-    # Update particle weights and resample
-    for particle in particles:
-        particle_lidar_distances = particle.lidar_scan(grid)
-        particle_pos = (int(particle.x), int(particle.y))
-        particle.update_weight(particle_lidar_distances, lidar_distances)
-    
-    if rover.vel_forward != 0 or rover.vel_angular != 0:
-        particles, variance = mh.resample_particles(particles, grid, valid_positions, pred_x, pred_y)        
-        pred_x, pred_y, pred_theta = mh.estimate(particles)
-    '''
\ No newline at end of file
+
+def parse_tile_range(text):
+    start, _, stop = text.partition(":")
+    return int(start), int(stop)
+
+
+def parse_levels(text):
+    return tuple(int(level) for level in text.split(","))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the lidar lookup table [x][y][angle].")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (1 builds serially in this process)")
+    parser.add_argument("--backend", default=mh.RAYCAST_BACKEND, choices=tuple(RAY_CASTERS),
+                        help="ray casting backend")
+    parser.add_argument("--builder", default="cast", choices=BUILDERS,
+                        help="cast the rays of every cell, or sweep: propagate ranges along each "
+                             "beam angle over the whole grid (much faster, single process)")
+    parser.add_argument("--step", type=int, default=1, help="sampling step in pixels")
+    parser.add_argument("--resume", action="store_true",
+                        help="keep tiles completed by a previous build with the same parameters")
+    parser.add_argument("--tiles", type=parse_tile_range, metavar="START:STOP",
+                        help=f"only build tiles START..STOP-1 ({TILE_WIDTH} columns each), keeping the "
+                             "tiles of earlier builds with the same parameters (implies --resume)")
+    parser.add_argument("--headless", action="store_true",
+                        help="do not open a pygame window or limit the frame rate")
+    parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL,
+                        help="seconds between progress reports")
+    parser.add_argument("--pyramid", nargs="?", const=PYRAMID_LEVELS, type=parse_levels, metavar="PPI,...",
+                        help="also save a multi-resolution pyramid of the table to "
+                             f"{LOOKUP_PYRAMID_FILE} (default levels: {','.join(map(str, PYRAMID_LEVELS))})")
+    args = parser.parse_args()
+    main(args.workers, args.backend, args.step, args.resume, args.tiles,
+         args.headless, args.progress_interval, args.builder, args.pyramid)
@@ -1,10 +1,14 @@
+import sys
 import pygame
-import random
 import math
 import numpy as np
-from filterpy.monte_carlo import stratified_resample
-import pickle
 from pathlib import Path
+# Modules shared by both directories live in ../shared
+SHARED_DIR = str(Path(__file__).resolve().parent.parent / "shared")
+if SHARED_DIR not in sys.path:
+    sys.path.insert(0, SHARED_DIR)
+from lidar_raycast import cast_scan, obstacle_boxes
+from lidar_table import LookupSensorModel, LookupTableCache
 
 # Constants
 GRID_WIDTH = 96 + 2 # inches (one extra inch on each side for border)
@@ -22,6 +26,7 @@ MIN_SENSOR_READING = 3.0 / 2.54 # for RPLIDAR A1M8
 
 # Simulation parameters
 NUM_PARTICLES = 0
+RAYCAST_BACKEND = "march"  # "march" (500 samples per beam), "dda" (exact grid traversal) or "analytic"
 FORWARD_VELOCITY = 4 * ppi  # units per second
 ANGULAR_VELOCITY = math.radians(120)  # 60 degrees per second
 
@@ -32,12 +37,32 @@ MAX_SENSOR_STD = 0.787 # for RPLIDAR
 certainty = 0
 
 
-# Load sensor data from the same directory as this script (robust to CWD)
-data_file = Path(__file__).parent / "sensor_data_12_ppi_15_beam_angle.pkl"
-if not data_file.exists():
-    raise FileNotFoundError(f"Data file not found: {data_file!s}")
-with data_file.open('rb') as f:
-    loaded_sensor_readings = pickle.load(f)
+# Lookup table files, the first one that exists and was built for this maze
+# and ppi is loaded. A .lut (see convert_lookup_table.py) is memory-mapped
+# instead of unpickled. Without one, a table is built once into LOOKUP_CACHE_DIR.
+# The table is the 15-degree fan of lidar_scan, as its file names state
+LOOKUP_FILES = ["sensor_data_12_ppi_15_beam_angle.lut", "sensor_data_12_ppi_15_beam_angle.pkl"]
+LOOKUP_CACHE_DIR = Path(__file__).parent / "lookup_cache"
+BEAM_WIDTH = 15
+
+# Obstacles as (row_start, row_stop, col_start, col_stop) in inches, shared by
+# init_grid and the analytic ray caster
+OBSTACLE_RECTS = [
+    # Borders
+    (0, 1, 0, GRID_WIDTH),
+    (GRID_HEIGHT - 1, GRID_HEIGHT, 0, GRID_WIDTH),
+    (0, GRID_HEIGHT, 0, 1),
+    (0, GRID_HEIGHT, GRID_WIDTH - 1, GRID_WIDTH),
+    # Maze obstacles
+    (25, 37, 13, 25),
+    (13, 25, 25, 37),
+    (25, 37, 37, 61),
+    (1, 13, 49, 61),
+    (1, 13, 73, 85),
+    (25, 49, 73, 85),
+]
+OBSTACLE_BOXES = obstacle_boxes(OBSTACLE_RECTS)
+
 
 def init_grid():
     # Set unmovable space that is not an obstacle
@@ -55,20 +80,9 @@ def init_grid():
     grid[16:22, 64:88] = 0
     grid[4:46, 88:94] = 0
 
-    # Set borders as obstacles (1)
-    grid[0, 0:GRID_WIDTH] = 1
-    grid[GRID_HEIGHT - 1, 0:GRID_WIDTH] = 1
-
-    grid[0:GRID_HEIGHT, 0] = 1
-    grid[0:GRID_HEIGHT, GRID_WIDTH - 1] = 1
-
-    # Set obstacles to match maze
-    grid[25:37, 13:25] = 1
-    grid[13:25, 25:37] = 1
-    grid[25:37, 37:61] = 1
-    grid[1:13, 49:61] = 1
-    grid[1:13, 73:85] = 1
-    grid[25:49, 73:85] = 1
+    # Set borders and maze obstacles (1)
+    for row_start, row_stop, col_start, col_stop in OBSTACLE_RECTS:
+        grid[row_start:row_stop, col_start:col_stop] = 1
 
     return grid
 
@@ -88,6 +102,13 @@ def expand_grid(grid, factor):
     return expanded_grid
 
 
+# Sensor data from the same directory as this script (robust to CWD), loaded
+# on the first lookup or by sensor_model.warm_up()
+lookup_cache = LookupTableCache(LOOKUP_CACHE_DIR, init_grid(), ppi, beam_width=BEAM_WIDTH)
+sensor_model = LookupSensorModel((Path(__file__).parent / name for name in LOOKUP_FILES),
+                                 lookup_cache.metadata, lookup_cache)
+
+
 def display_grid(reduced_grid):
     for i in range(len(reduced_grid)):
         for j in range(len(reduced_grid[0])):
@@ -101,12 +122,8 @@ def display_grid(reduced_grid):
         
         
 def create_valid_positions(grid):
-    valid_positions = []
-    for i in range(len(grid)):
-        for j in range(len(grid[0])):
-            if grid[i][j] == 0:
-                valid_positions.append([j, i])
-    return valid_positions
+    """[x, y] of every free cell, in row order, as an (N, 2) array."""
+    return np.argwhere(np.asarray(grid) == 0)[:, ::-1]
 
 
 def draw_grid(window, grid):
@@ -130,22 +147,23 @@ def normal_pdf(x, mean, std_dev):
     return coefficient * exponent
 
 
-def particle_variance(particles, weights, pred_x, pred_y):    
-    variance_x = np.average([(p.x - pred_x)**2 / ppi**2 for p in particles], weights = weights)
-    variance_y = np.average([(p.y - pred_y)**2 / ppi**2 for p in particles], weights = weights)
-    
-    # Average the variances to get a single spread measure
-    return (variance_x + variance_y) / 2
+def normalized_weights(particles):
+    """Weights of the particles from their log weights, summing to 1."""
+    log_weight = np.fromiter((p.log_weight for p in particles), float, len(particles))
+    weight = np.exp(log_weight - log_weight.max())
+    return weight / weight.sum()
+
 
 def estimate(particles):
-    particles_x = [p.x for p in particles]
-    particles_y = [p.y for p in particles]
-    particles_theta = [p.theta for p in particles]
-    weights = [p.weight for p in particles]
-    mean_x = np.average(particles_x, weights = weights)
-    mean_y = np.average(particles_y, weights = weights)
-    mean_theta = np.average(particles_theta, weights = weights)
-    
+    poses = np.array([(p.x, p.y, p.theta) for p in particles])
+    x, y, theta = poses.T
+    weights = normalized_weights(particles)
+    mean_x = np.average(x, weights=weights)
+    mean_y = np.average(y, weights=weights)
+    # Circular mean, so headings either side of 0 / 2pi do not average to pi
+    mean_theta = np.arctan2(np.average(np.sin(theta), weights=weights),
+                            np.average(np.cos(theta), weights=weights)) % (2 * np.pi)
+
     return mean_x, mean_y, mean_theta
 
 
@@ -153,49 +171,6 @@ def normalize_angle(angle):
     return int(angle % 360)
 
 
-def resample_particles(particles, grid, valid_positions, pred_x, pred_y):
-    weights = [p.weight for p in particles]
-    total_weight = sum(weights)    
-    # Normalize weights
-    weights = [w / total_weight for w in weights]
-    variance = particle_variance(particles, weights, pred_x, pred_y)
-    certainty = ppi**2 * 2 / (variance)
-    print(f"Certainty: {min(certainty, 1)}")
-    adjusted_num_particles = max(int(NUM_PARTICLES * max(1 - certainty, 0)), 1000)
-
-    # resampling algorithm
-    indexes = stratified_resample(weights)
-        
-    # resample from index
-    particles = [particles[i] for i in indexes[:adjusted_num_particles]]
-    # print(len(particles))
-    
-    # Jitter the particles' positions and orientations to keep them close to their original pose
-    def jitter_particle(particle):
-        # Add a small random noise to position (pose.x, pose.y) and orientation (pose.theta)
-        noise_scale = max(1 - certainty, 0)
-        new_x = particle.x + np.random.normal(0, 0.5 + 2 * noise_scale)  # Jitter in x-axis
-        new_y = particle.y + np.random.normal(0, 0.5 + 2 * noise_scale)  # Jitter in y-axis
-        new_theta = particle.theta + np.random.normal(0, 0.1)  # Jitter in orientation
-        
-        # Create a new particle with a similar pose
-        new_particle = Particle(grid, valid_positions)
-        if 0 <= int(new_x) < len(grid[0]) and 0 <= int(new_y) < len(grid) and grid[int(new_y)][int(new_x)] == 0:
-            new_particle.x = new_x
-            new_particle.y = new_y
-        else:
-            new_particle.x = particle.x
-            new_particle.y = particle.y
-        new_particle.theta = new_theta
-        new_particle.weight = 1.0 / len(particles)  # Reset weights to be equal
-        return new_particle
-    
-    # Apply jitter to resampled particles and also add some random jitter for new exploration
-    jittered_particles = [jitter_particle(p) for p in particles]
-    
-    return jittered_particles, variance
-
-
 def update_particles(particles, rover, dt, grid):
     """Move particle weights."""
     for particle in particles:
@@ -212,7 +187,8 @@ def draw_orientation(window, x, y, theta, length=10, color=BLACK):
 
 # Rover class
 class Rover:
-    def __init__(self, grid, valid_positions):
+    def __init__(self, grid, valid_positions, rng=None):
+        self.rng = np.random.default_rng() if rng is None else rng
         while True:
             pos = (valid_positions[0])
             self.x = pos[0]
@@ -225,8 +201,7 @@ class Rover:
 
     def move(self, dt, grid):
         # Apply noise to movement
-        forward_noise = random.gauss(0, MOVEMENT_NOISE)
-        angular_noise = random.gauss(0, math.radians(2))
+        forward_noise, angular_noise = self.rng.normal(0, (MOVEMENT_NOISE, math.radians(2)))
 
         # Calculate proposed new position
         new_x = self.x + (self.vel_forward) * math.cos(self.theta) * dt
@@ -239,89 +214,37 @@ class Rover:
             self.y = new_y
         self.theta = new_theta
     
-    def lidar_scan(self, grid):
-        """Simulate a lidar scan with a 180-degree beam width for the rover,
-        using a 15-degree beam width (fan) for each scan angle."""
+    def lidar_scan(self, grid, backend=RAYCAST_BACKEND):
+        """Simulate a 360-beam lidar scan (one ray per degree) for the rover."""
         scan_angles = np.linspace(0, 359, 360) * (math.pi / 180)  # Main scan angles
-        #num_scan_angles = 73
-        #scan_angles = np.linspace(0, 360, num_scan_angles) * (math.pi / 180)  # Main scan angles
-        #beam_half_angle = 7.5 * (math.pi / 180)  # Half of 15 degrees in radians
-        lidar_distances = np.zeros(360)
-
-        for index, angle in enumerate(scan_angles):
-            scan_angle = self.theta + angle
-            sensor_x = self.x + 3.0 * ppi * math.cos(scan_angle)
-            sensor_y =  self.y + 3.0 * ppi * math.sin(scan_angle)
-            
-            # Fan out with multiple scan lines within ±7.5 degrees
-            num_beams = 1
-            #beam_angles = np.linspace(scan_angle - beam_half_angle, scan_angle + beam_half_angle, num_beams)
-
-            # Track the shortest distance found within this beam
-            min_distance = MAX_SENSOR_READING
-            hit_found = False
-
-            #for beam_angle in beam_angles:
-            for dist in np.linspace(0, (MAX_SENSOR_READING) * ppi, 500):  # High-resolution scan range
-                scan_x = dist * math.cos(scan_angle) + sensor_x
-                scan_y = dist * math.sin(scan_angle) + sensor_y
-
-                # Check for boundaries or obstacles
-                if 0 <= int(scan_x) < len(grid[0]) and 0 <= int(scan_y) < len(grid):
-                    if grid[int(scan_y)][int(scan_x)] == 1:  # Hit an obstacle
-                        # Return the exact pixel point for the lidar
-                        boundary_x = int(scan_x)
-                        boundary_y = int(scan_y)
-                        lidar_distance = math.sqrt((boundary_x - sensor_x)**2 + (boundary_y - sensor_y)**2)
-
-                        # Keep track of the closest hit distance within this beam
-                        min_distance = min(min_distance, lidar_distance / float(ppi))
-                        hit_found = True
-                        break  # Stop scanning further in this direction
-                # If no obstacle was found within the beam angle, move to the next one
-
-            # Append the shortest distance found for this scan angle
-            if hit_found:
-                # lidar_distances.append(max(min_distance, MIN_SENSOR_READING))
-                lidar_distances[index] = max(min_distance, MIN_SENSOR_READING)
-                # lidar_distances[index] = min_distance
-            else:
-                # No obstacle found within the beam
-                lidar_distances[index] = MAX_SENSOR_READING
-                # lidar_distances.append(MAX_SENSOR_READING)
-
-        return lidar_distances
+        scene = OBSTACLE_BOXES if backend == "analytic" else grid
+        return cast_scan(scene, self.x, self.y, self.theta + scan_angles, ppi, backend=backend)
     
     def lidar_scan_fast(self):
         """Simulate a lidar scan with a 180-degree beam width for the rover,
         using a 15-degree beam width (fan) for each scan angle."""
         # scan_angles = np.linspace(0, 359, 360) * (math.pi / 180)  # Main scan angles
         scan_angles = np.linspace(-90, 90, 7)  # Main scan angles
-        lidar_distances = []  # List to hold shortest lidar hit distance for each scan angle
-
-        for angle in scan_angles:
-            scan_angle = self.theta * (180 / math.pi) + angle
-            lidar_distances.append(loaded_sensor_readings[int(self.x)][int(self.y)][normalize_angle(scan_angle)])
-        
-        return lidar_distances
+        angle_bins = ((self.theta * (180 / math.pi) + scan_angles) % 360).astype(int)
+        return sensor_model.lookup(int(self.x), int(self.y), angle_bins)
     
 
 # Particle class
 class Particle:
-    def __init__(self, grid, valid_positions):
+    def __init__(self, grid, valid_positions, rng=None):
+        self.rng = np.random.default_rng() if rng is None else rng
         while True:
-            pos = random.choice(valid_positions)
+            pos = valid_positions[self.rng.integers(len(valid_positions))]
             self.x = pos[0]
             self.y = pos[1]
             if grid[self.y][self.x] == 0:
                 break
-        self.theta = random.uniform(0, 2 * math.pi)
-        self.weight = 1.0 / NUM_PARTICLES
+        self.theta = self.rng.uniform(0, 2 * math.pi)
+        self.log_weight = -math.log(max(NUM_PARTICLES, 1))
 
     def move(self, forward_velocity, angular_velocity, dt, grid):
         # Add movement noise
-        forward_noise = random.gauss(0, MOVEMENT_NOISE)
-        angular_noise = random.gauss(0, math.radians(2))
+        forward_noise, angular_noise = self.rng.normal(0, (MOVEMENT_NOISE, math.radians(2)))
 
         # Calculate new position
         new_x = self.x + (forward_velocity + forward_noise) * math.cos(self.theta) * dt
@@ -335,64 +258,21 @@ class Particle:
         self.theta = new_theta
         
     def update_weight(self, lidar_distances, expected_distances):
-        """Update particle weight based on the lidar readings."""
-        # Calculate how closely the lidar readings match expected points     
-        sensor_std = MIN_SENSOR_STD + (MAX_SENSOR_STD - MIN_SENSOR_STD) * max(1 - certainty, 0)
+        """Add the log likelihood of the lidar readings to the particle's log weight."""
+        # The log of each beam's normal_pdf, up to a constant the normalization drops, so it cannot underflow
+        sensor_std = (MIN_SENSOR_STD + (MAX_SENSOR_STD - MIN_SENSOR_STD) * max(1 - certainty, 0)) * ppi
         for lidar, expected in zip(lidar_distances, expected_distances):
-            self.weight *= normal_pdf(expected, lidar, sensor_std * ppi)
-        self.weight += 1.e-300
+            self.log_weight -= 0.5 * ((expected - lidar) / sensor_std) ** 2
 
-    def lidar_scan(self, grid):
-        """Simulate a lidar scan with a 180-degree beam width for the rover,
-        using a 15-degree beam width (fan) for each scan angle."""
+    def lidar_scan(self, grid, backend=RAYCAST_BACKEND):
+        """Simulate a 73-beam lidar scan, fanning each beam into two sub-rays
+        1 degree apart and keeping the shortest range."""
         num_scan_angles = 73
         scan_angles = np.linspace(0, 360, num_scan_angles) * (math.pi / 180)  # Main scan angles
-        beam_half_angle = 0.5 * (math.pi / 180)  # Half of 15 degrees in radians
-        lidar_distances = np.zeros(num_scan_angles)
-
-        for index, angle in enumerate(scan_angles):
-            scan_angle = self.theta + angle
-            sensor_x = self.x + 3.0 * ppi * math.cos(scan_angle)
-            sensor_y =  self.y + 3.0 * ppi * math.sin(scan_angle)
-            
-            # Fan out with multiple scan lines within ±7.5 degrees
-            num_beams = 2
-            beam_angles = np.linspace(scan_angle - beam_half_angle, scan_angle + beam_half_angle, num_beams)
-
-            # Track the shortest distance found within this beam
-            min_distance = MAX_SENSOR_READING
-            hit_found = False
-
-            for beam_angle in beam_angles:
-                for dist in np.linspace(0, (MAX_SENSOR_READING) * ppi, 500):  # High-resolution scan range
-                    scan_x = sensor_x + dist * math.cos(beam_angle)
-                    scan_y = sensor_y + dist * math.sin(beam_angle)
-
-                    # Check for boundaries or obstacles
-                    if 0 <= int(scan_x) < len(grid[0]) and 0 <= int(scan_y) < len(grid):
-                        if grid[int(scan_y)][int(scan_x)] == 1:  # Hit an obstacle
-                            # Return the exact pixel point for the lidar
-                            boundary_x = int(scan_x)
-                            boundary_y = int(scan_y)
-                            lidar_distance = math.sqrt((boundary_x - sensor_x)**2 + (boundary_y - sensor_y)**2)
-
-                            # Keep track of the closest hit distance within this beam
-                            min_distance = min(min_distance, lidar_distance / float(ppi))
-                            hit_found = True
-                            break  # Stop scanning further in this direction
-                # If no obstacle was found within the beam angle, move to the next one
-
-            # Append the shortest distance found for this scan angle
-            if hit_found:
-                # lidar_distances.append(max(min_distance, MIN_SENSOR_READING))
-                lidar_distances[index] = max(min_distance, MIN_SENSOR_READING)
-                # lidar_distances[index] = min_distance
-            else:
-                # No obstacle found within the beam
-                lidar_distances[index] = MAX_SENSOR_READING
-                # lidar_distances.append(MAX_SENSOR_READING)
-
-        return lidar_distances
+        beam_half_angle = 0.5 * (math.pi / 180)
+        beam_offsets = np.linspace(-beam_half_angle, beam_half_angle, 2)
+        scene = OBSTACLE_BOXES if backend == "analytic" else grid
+        return cast_scan(scene, self.x, self.y, self.theta + scan_angles, ppi, beam_offsets, backend)
     
     
     def lidar_scan_fast(self):
@@ -400,10 +280,5 @@ class Particle:
         using a 15-degree beam width (fan) for each scan angle."""
         # scan_angles = np.linspace(0, 359, 360) * (math.pi / 180)  # Main scan angles
         scan_angles = np.linspace(-90, 90, 7)  # Main scan angles
-        lidar_distances = []  # List to hold shortest lidar hit distance for each scan angle
-
-        for angle in scan_angles:
-            scan_angle = self.theta * (180 / math.pi) + angle
-            lidar_distances.append(loaded_sensor_readings[int(self.x)][int(self.y)][normalize_angle(scan_angle)])
-        
-        return lidar_distances
\ No newline at end of file
+        angle_bins = ((self.theta * (180 / math.pi) + scan_angles) % 360).astype(int)
+        return sensor_model.lookup(int(self.x), int(self.y), angle_bins)
\ No newline at end of file
@@ -1,11 +1,11 @@
+import argparse
+import time
 import pygame
 import math
 import copy
+import numpy as np
 import original_mcl_helper_Copy as mh
-from original_mcl_helper_Copy import Rover, Particle
-
-# Initialize pygame
-pygame.init()
+from original_mcl_helper_Copy import Rover, ParticleSet
 
 # Constants (some are same as mcl_helper.py, will clean up in future)
 GRID_WIDTH = 96 + 2 # inches (one extra inch on each side for border)
@@ -25,86 +25,168 @@ MIN_SENSOR_READING = 3.0 / 2.54
 NUM_PARTICLES = mh.NUM_PARTICLES
 FORWARD_VELOCITY = 4 * ppi  # inches per second
 ANGULAR_VELOCITY = math.radians(120)  # 120 degrees per second
-    
-    
-grid = mh.init_grid()
-reduced_grid = copy.deepcopy(grid)
-grid = mh.expand_grid(grid, ppi)
-valid_positions = mh.create_valid_positions(grid)
-
-
-# Initialize rover and particles
-rover = Rover(grid, valid_positions)
-particles = [Particle(grid, valid_positions) for _ in range(NUM_PARTICLES)]
-pred_x, pred_y, pred_theta = mh.estimate(particles)
-
-# Initialize window
-print(len(grid[0]))
-print(len(grid))
-window = pygame.display.set_mode((len(grid[0]), len(grid)))
-pygame.display.set_caption("Rover Simulation with Edges as Obstacles")
-
-# Main loop
-running = True
-clock = pygame.time.Clock()
-
-while running:
-    window.fill(WHITE)
-    mh.draw_grid(window, reduced_grid)
-
-    # User input for rover control
-    keys = pygame.key.get_pressed()
-    if keys[pygame.K_w]:
-        rover.vel_forward = FORWARD_VELOCITY
-    elif keys[pygame.K_s]:
-        rover.vel_forward = -FORWARD_VELOCITY
-    else:
-        rover.vel_forward = 0
 
-    if keys[pygame.K_a]:
-        rover.vel_angular = -ANGULAR_VELOCITY
-    elif keys[pygame.K_d]:
-        rover.vel_angular = ANGULAR_VELOCITY
+# Headless mode: fixed time step and a scripted drive instead of the keyboard
+HEADLESS_DT = 1 / 60  # seconds per simulated frame
+HEADLESS_COMMANDS = [("w", 90), ("d", 15), ("w", 90), ("a", 30), ("s", 45), ("d", 15)]  # (key, frames)
+PROGRESS_INTERVAL = 5.0  # seconds between progress reports in headless mode
+
+
+def scripted_velocities(frame):
+    """Rover velocities for a frame of the repeating HEADLESS_COMMANDS drive."""
+    frame %= sum(frames for _, frames in HEADLESS_COMMANDS)
+    for key, frames in HEADLESS_COMMANDS:
+        if frame < frames:
+            break
+        frame -= frames
+    vel_forward = {"w": FORWARD_VELOCITY, "s": -FORWARD_VELOCITY}.get(key, 0)
+    vel_angular = {"a": -ANGULAR_VELOCITY, "d": ANGULAR_VELOCITY}.get(key, 0)
+    return vel_forward, vel_angular
+
+
+def main(headless=False, max_frames=None, progress_interval=PROGRESS_INTERVAL, pyramid=False,
+         sensor_model=mh.SENSOR_MODEL, resample_ess_fraction=mh.RESAMPLE_ESS_FRACTION, adaptive=True,
+         seed=None):
+    grid = mh.init_grid()
+    reduced_grid = copy.deepcopy(grid)
+    grid = mh.expand_grid(grid, ppi)
+    free_space = mh.FreeSpaceIndex(grid)
+
+    # Load the lookup table now rather than in the middle of the first frame
+    if sensor_model == "likelihood_field":
+        field = mh.LikelihoodField(grid, ppi)
+    elif pyramid:
+        mh.pyramid_model.warm_up()
     else:
-        rover.vel_angular = 0
-
-    # Move rover and particles
-    dt = clock.get_time() / 1000  # Time in seconds
-    rover.move(dt, grid)
-    mh.update_particles(particles, rover, dt, grid)  # Pass dt to particles
-
-    # Draw particles with orientation lines
-    for particle in particles:
-        particle_pos = (int(particle.x), int(particle.y))
-        pygame.draw.circle(window, RED, particle_pos, ppi / 2)
-        mh.draw_orientation(window, particle_pos[0], particle_pos[1], particle.theta, length=ppi * 2, color=RED)
-
-    # Draw rover as a square and its orientation
-    rover_pos = (int(rover.x), int(rover.y))
-    rover_rect = pygame.Rect(rover_pos[0] - ppi, rover_pos[1] - ppi, 2 * ppi, 2 * ppi)  # Rover as a larger square
-    pygame.draw.rect(window, BLACK, rover_rect)  # Draw rover in black
-    mh.draw_orientation(window, rover_pos[0], rover_pos[1], rover.theta, length=ppi, color=GREEN)
-
-    # Lidar scan for the rover and draw points
-    lidar_distances = rover.lidar_scan(grid)
-    particle_lidar_distances = []
-
-    # Update particle weights and resample
-    for particle in particles:
-        particle_lidar_distances = particle.lidar_scan_fast()
-        particle_pos = (int(particle.x), int(particle.y))
-        particle.update_weight(particle_lidar_distances, lidar_distances)
-    
-    if rover.vel_forward != 0 or rover.vel_angular != 0:
-        particles, variance = mh.resample_particles(particles, grid, valid_positions, pred_x, pred_y)        
-        pred_x, pred_y, pred_theta = mh.estimate(particles)
-
-    # Event handling
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    pygame.display.flip()
-    clock.tick(60)  # 60 FPS
-    
-pygame.quit()
\ No newline at end of file
+        mh.sensor_model.warm_up()
+
+    # Initialize rover and particles, both drawing from one generator so a seed reproduces the run
+    rng = np.random.default_rng(seed)
+    rover = Rover(free_space, rng)
+    particles = ParticleSet.uniform(free_space, NUM_PARTICLES, mh.PARTICLE_DTYPE, rng)
+    pred_x, pred_y, pred_theta = mh.estimate(particles)
+
+    if not headless:
+        # Initialize pygame and window
+        pygame.init()
+        print(len(grid[0]))
+        print(len(grid))
+        window = pygame.display.set_mode((len(grid[0]), len(grid)))
+        pygame.display.set_caption("Rover Simulation with Edges as Obstacles")
+        clock = pygame.time.Clock()
+
+    # Main loop
+    running = True
+    frame = 0
+    start = last_report = time.perf_counter()
+
+    while running:
+        if headless:
+            rover.vel_forward, rover.vel_angular = scripted_velocities(frame)
+            dt = HEADLESS_DT
+        else:
+            window.fill(WHITE)
+            mh.draw_grid(window, reduced_grid)
+
+            # User input for rover control
+            keys = pygame.key.get_pressed()
+            if keys[pygame.K_w]:
+                rover.vel_forward = FORWARD_VELOCITY
+            elif keys[pygame.K_s]:
+                rover.vel_forward = -FORWARD_VELOCITY
+            else:
+                rover.vel_forward = 0
+
+            if keys[pygame.K_a]:
+                rover.vel_angular = -ANGULAR_VELOCITY
+            elif keys[pygame.K_d]:
+                rover.vel_angular = ANGULAR_VELOCITY
+            else:
+                rover.vel_angular = 0
+
+            dt = clock.get_time() / 1000  # Time in seconds
+
+        # Move rover and particles
+        rover.move(dt, grid)
+        mh.update_particles(particles, rover, dt, free_space)  # Pass dt to particles
+
+        if not headless:
+            # Draw particles with orientation lines
+            for particle in particles:
+                particle_pos = (int(particle.x), int(particle.y))
+                pygame.draw.circle(window, RED, particle_pos, ppi / 2)
+                mh.draw_orientation(window, particle_pos[0], particle_pos[1], particle.theta, length=ppi * 2, color=RED)
+
+            # Draw rover as a square and its orientation
+            rover_pos = (int(rover.x), int(rover.y))
+            rover_rect = pygame.Rect(rover_pos[0] - ppi, rover_pos[1] - ppi, 2 * ppi, 2 * ppi)  # Rover as a larger square
+            pygame.draw.rect(window, BLACK, rover_rect)  # Draw rover in black
+            mh.draw_orientation(window, rover_pos[0], rover_pos[1], rover.theta, length=ppi, color=GREEN)
+
+        # Lidar scan for the rover and draw points
+        lidar_distances = rover.lidar_scan(grid)
+
+        # Update particle weights and resample
+        if sensor_model == "likelihood_field":
+            mh.weight_particles_likelihood_field(particles, field, lidar_distances)
+        elif pyramid:
+            mh.weight_particles_coarse_to_fine(particles, lidar_distances)
+        else:
+            mh.weight_particles_beam(particles, lidar_distances)
+
+        # Resample while moving, once the weights have degenerated enough
+        ess = particles.effective_sample_size()
+        moving = rover.vel_forward != 0 or rover.vel_angular != 0
+        if moving and ess < resample_ess_fraction * len(particles):
+            particles, variance = mh.resample_particles(particles, free_space, pred_x, pred_y, verbose=not headless,
+                                                        adaptive=adaptive)
+        summary = mh.summarize(particles)
+        pred_x, pred_y, pred_theta = mh.estimate(particles, summary)
+
+        frame += 1
+        if headless:
+            now = time.perf_counter()
+            if max_frames is not None and frame >= max_frames:
+                running = False
+            if progress_interval and (now - last_report >= progress_interval or not running):
+                last_report = now
+                error = math.hypot(pred_x - rover.x, pred_y - rover.y) / ppi
+                print(f"frame {frame}: {frame / (now - start):.1f} frames/s, "
+                      f"{len(particles)} particles, estimate error {error:.1f} in, ESS {ess:.0f}, "
+                      f"spread {summary.position_std / ppi:.1f} in, top mode {summary.modes[0, 0]:.0%}"
+                      f"{', converged' if mh.converged(summary) else ''}")
+        else:
+            # Event handling
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+
+            pygame.display.flip()
+            clock.tick(60)  # 60 FPS
+
+    if not headless:
+        pygame.quit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo localization simulation.")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a window or frame-rate limit, driving a scripted path")
+    parser.add_argument("--frames", type=int, help="stop after this many frames (headless mode)")
+    parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL,
+                        help="seconds between progress reports in headless mode (0 disables them)")
+    parser.add_argument("--pyramid", action="store_true",
+                        help="weight particles coarse to fine with the lookup table pyramid")
+    parser.add_argument("--sensor-model", default=mh.SENSOR_MODEL, choices=mh.SENSOR_MODELS,
+                        help="beam: compare lookup table ranges, likelihood_field: score scan endpoints "
+                             "against a distance field")
+    parser.add_argument("--resample-ess-fraction", type=float, default=mh.RESAMPLE_ESS_FRACTION,
+                        help="resample when the effective sample size drops below this share of the particles "
+                             "(1 resamples every moving frame)")
+    parser.add_argument("--fixed-particles", action="store_true",
+                        help=f"keep {mh.NUM_PARTICLES} particles instead of choosing the count by KLD-sampling")
+    parser.add_argument("--seed", type=int,
+                        help="seed the rover's and the particles' random draws to reproduce a run")
+    args = parser.parse_args()
+    main(args.headless, args.frames, args.progress_interval, args.pyramid, args.sensor_model,
+         args.resample_ess_fraction, not args.fixed_particles, args.seed)
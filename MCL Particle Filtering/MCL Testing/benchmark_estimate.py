@@ -0,0 +1,73 @@
+"""Time the pose summary and check it on headings across the seam and on two clusters.
+
+Times `ParticleSet.summary` (circular mean, covariance, histogram modes)
+against the linear `estimate` plus `variance` it replaces. The 5000 case is
+the filter's usual size and the 60 frames/s frame sets the scale. Two
+synthetic sets then show what the estimators return:
+
+- seam: one cluster whose headings straddle 0 / 2pi;
+- two clusters: equal halves at opposite ends of the field, where the mean
+  falls between them and the strongest mode sits on one.
+
+Usage: python benchmark_estimate.py [repeats]
+"""
+import sys
+import numpy as np
+import original_mcl_helper_Copy as mh
+from benchmarking import best_time
+
+COUNTS = (5000, 50000, 500000)
+FRAME_BUDGET = 1 / 60  # seconds
+CLUSTER_STD = (0.5 * mh.ppi, np.radians(5))
+
+
+def linear_estimate(particles):
+    """The estimate before the circular mean: weighted averages, theta included."""
+    weight = particles.normalized_weights()
+    return weight @ particles.x, weight @ particles.y, weight @ particles.theta
+
+
+def cluster(rng, count, x, y, theta):
+    return (x + CLUSTER_STD[0] * rng.standard_normal(count), y + CLUSTER_STD[0] * rng.standard_normal(count),
+            (theta + CLUSTER_STD[1] * rng.standard_normal(count)) % (2 * np.pi))
+
+
+def show(name, particles, true_poses):
+    summary = mh.summarize(particles)
+    x, y, theta = mh.estimate(particles, summary)
+    linear_x, linear_y, linear_theta = linear_estimate(particles)
+    poses = ", ".join(f"({px / mh.ppi:.0f} in, {py / mh.ppi:.0f} in, {np.degrees(pt):.0f} deg)"
+                      for px, py, pt in true_poses)
+    print(f"{name}: true {poses}")
+    print(f"    linear mean   ({linear_x / mh.ppi:5.1f} in, {linear_y / mh.ppi:5.1f} in, "
+          f"{np.degrees(linear_theta):5.1f} deg)")
+    print(f"    mh.estimate   ({x / mh.ppi:5.1f} in, {y / mh.ppi:5.1f} in, {np.degrees(theta):5.1f} deg), "
+          f"spread {summary.position_std / mh.ppi:.1f} in, heading std {np.degrees(summary.heading_std):.1f} deg, "
+          f"converged {mh.converged(summary)}")
+    for weight, mode_x, mode_y, mode_theta in summary.modes:
+        print(f"    mode {weight:4.0%}     ({mode_x / mh.ppi:5.1f} in, {mode_y / mh.ppi:5.1f} in, "
+              f"{np.degrees(mode_theta):5.1f} deg)")
+
+
+def main(repeats=10):
+    grid = mh.expand_grid(mh.init_grid(), mh.ppi)
+    free_space = mh.FreeSpaceIndex(grid)
+    rng = np.random.default_rng(0)
+    for count in COUNTS:
+        particles = mh.ParticleSet.uniform(free_space, count, mh.PARTICLE_DTYPE, rng)
+        particles.update_weights(rng.normal(0, 3, count))
+        linear = best_time(lambda: (particles.estimate(), particles.variance(0, 0, mh.ppi)), repeats)
+        summary = best_time(lambda: mh.summarize(particles), repeats)
+        print(f"{count:>7} particles: summary {1000 * summary:7.2f} ms ({summary / FRAME_BUDGET:.1%} of a frame), "
+              f"estimate + variance {1000 * linear:7.2f} ms")
+
+    height, width = grid.shape
+    seam = (width / 2, height / 2, 0.0)
+    show("seam", mh.ParticleSet(*cluster(rng, 5000, *seam), rng=rng), [seam])
+    left, right = (width / 5, height / 2, np.pi / 2), (4 * width / 5, height / 2, np.pi / 2)
+    halves = [np.concatenate(values) for values in zip(cluster(rng, 2500, *left), cluster(rng, 2500, *right))]
+    show("two clusters", mh.ParticleSet(*halves, rng=rng), [left, right])
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
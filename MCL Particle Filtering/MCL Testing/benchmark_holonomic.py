@@ -0,0 +1,83 @@
+"""Tracking quality of the holonomic motion model against a unicycle one.
+
+The simulated rover drives random firmware commands (kiwi_drive.COMMAND_STEPS,
+sideways slides included) with `Rover.move_steps`. Particle sets of several
+sizes start around its true pose and track it with:
+
+- holonomic: `update_particles_holonomic`, the same kiwi drive kinematics;
+- unicycle: the forward motion and rotation only, as `Particle.move` would,
+  with the unmodelled slide absorbed as sideways noise of its size.
+
+Every model and size sees the same trajectories and scans. The error is the
+distance in inches between the estimate and the rover.
+
+Usage: python benchmark_holonomic.py [frames] [runs]
+"""
+import sys
+import numpy as np
+import original_mcl_helper_Copy as mh
+from kiwi_drive import COMMAND_STEPS
+
+COUNTS = (20, 50, 100, 200, 500)
+LOST_ERROR = 5.0  # inches
+START_STD = (2.0 * mh.ppi, np.radians(10))  # spread of the initial particles around the true pose
+SETTLE_FRAMES = 10  # frames left out of the averages
+
+
+def drive(grid, free_space, frames, seed):
+    """Steps, true poses and rover scans of one random command sequence."""
+    rng = np.random.default_rng(seed)
+    rover = mh.Rover(free_space, rng)
+    start = (rover.x, rover.y, rover.theta)
+    trajectory = []
+    for _ in range(frames):
+        steps = COMMAND_STEPS[rng.choice(list("wwwsqeaadd"))]
+        rover.move_steps(steps, grid)
+        trajectory.append((steps, (rover.x, rover.y), rover.lidar_scan(grid)))
+    return start, trajectory
+
+
+def move_unicycle(particles, steps, free_space):
+    motion, std = mh.holonomic_motion(steps)
+    forward, left, rotation = motion
+    particles.move_body(forward, 0.0, rotation, free_space, std[0], std[1] + abs(left), std[2])
+
+
+def track(start, trajectory, free_space, count, move, seed):
+    """Per-frame estimate errors in inches of one particle set following a trajectory."""
+    rng = np.random.default_rng(seed)
+    x, y, theta = start
+    particles = mh.ParticleSet(x + START_STD[0] * rng.standard_normal(count),
+                               y + START_STD[0] * rng.standard_normal(count),
+                               theta + START_STD[1] * rng.standard_normal(count), rng=rng)
+    pred_x, pred_y, _ = particles.estimate()
+    errors = []
+    for steps, (true_x, true_y), scan in trajectory:
+        move(particles, steps, free_space)
+        mh.weight_particles_beam(particles, scan)
+        if particles.effective_sample_size() < mh.RESAMPLE_ESS_FRACTION * len(particles):
+            particles, _ = mh.resample_particles(particles, free_space, pred_x, pred_y, verbose=False,
+                                                 adaptive=False)
+        pred_x, pred_y, _ = particles.estimate()
+        errors.append(np.hypot(pred_x - true_x, pred_y - true_y) / mh.ppi)
+    return np.array(errors)
+
+
+def main(frames=100, runs=5):
+    grid = mh.expand_grid(mh.init_grid(), mh.ppi)
+    free_space = mh.FreeSpaceIndex(grid)
+    mh.sensor_model.warm_up()
+    drives = [drive(grid, free_space, frames, seed) for seed in range(runs)]
+
+    models = (("holonomic", mh.update_particles_holonomic), ("unicycle", move_unicycle))
+    print(f"{runs} runs of {frames} commands, after {SETTLE_FRAMES} frames")
+    for count in COUNTS:
+        for name, move in models:
+            errors = np.concatenate([track(start, trajectory, free_space, count, move, seed)[SETTLE_FRAMES:]
+                                     for seed, (start, trajectory) in enumerate(drives)])
+            print(f"{count:>5} particles, {name:>9}: mean error {errors.mean():5.2f} in, "
+                  f"median {np.median(errors):5.2f} in, lost (> {LOST_ERROR:.0f} in) {np.mean(errors > LOST_ERROR):5.1%}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
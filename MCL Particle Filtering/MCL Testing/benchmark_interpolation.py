@@ -0,0 +1,58 @@
+"""Accuracy of lookup tables against their size, with and without interpolation.
+
+Builds a table at each resolution in TABLE_PPIS and reads it at random
+continuous poses (sub-pixel positions, any heading) both the way the particles
+used to, truncating to the cell and angle bin below, and with
+`interpolated_lookup`. Both are compared with the analytic ray caster, which
+has no discretization at all.
+
+Usage: python benchmark_interpolation.py [num_poses]
+"""
+import sys
+import time
+import numpy as np
+import original_mcl_helper_Copy as mh
+from lidar_raycast import cast_scan
+from lidar_table import build_table, interpolated_lookup
+
+TABLE_PPIS = (1, 2, 3, 5)
+SCAN_ANGLES = np.linspace(0, 360, 72)  # degrees relative to the heading, as Particle.lidar_scan_fast
+
+
+def random_poses(base_grid, num_poses, rng):
+    """Poses in inches spread uniformly over the free inch cells, headings in degrees."""
+    free_y, free_x = np.nonzero(np.asarray(base_grid) == 0)
+    cells = rng.integers(free_x.size, size=num_poses)
+    x = free_x[cells] + rng.random(num_poses)
+    y = free_y[cells] + rng.random(num_poses)
+    return x, y, rng.uniform(0, 360, num_poses)
+
+
+def errors(ranges, reference):
+    error = np.abs(ranges - reference)
+    return error.mean(), np.percentile(error, 99)
+
+
+def main(num_poses=20000):
+    base_grid = mh.init_grid()
+    x, y, theta = random_poses(base_grid, num_poses, np.random.default_rng(0))
+    beam_angles = (theta[:, None] + SCAN_ANGLES) % 360
+    reference = cast_scan(mh.OBSTACLE_BOXES, x, y, np.radians(beam_angles), 1, backend="analytic")
+
+    print(f"{num_poses} poses x {SCAN_ANGLES.size} beams, errors in inches against the analytic caster")
+    print(f"{'ppi':>4} {'size MB':>8} {'build s':>8} {'truncated mean/p99':>19} {'interpolated mean/p99':>22}")
+    for table_ppi in TABLE_PPIS:
+        start = time.perf_counter()
+        table = build_table(base_grid, table_ppi)
+        build_time = time.perf_counter() - start
+
+        table_x, table_y = x[:, None] * table_ppi, y[:, None] * table_ppi
+        truncated = table.lookup(table_x.astype(int), table_y.astype(int), beam_angles.astype(int))
+        interpolated = interpolated_lookup(table, table_x, table_y, beam_angles)
+        print(f"{table_ppi:>4} {table.nbytes / 1e6:>8.1f} {build_time:>8.1f} "
+              f"{'%.2f / %.1f' % errors(truncated, reference):>19} "
+              f"{'%.2f / %.1f' % errors(interpolated, reference):>22}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
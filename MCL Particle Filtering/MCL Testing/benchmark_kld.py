@@ -0,0 +1,41 @@
+"""Compare KLD-sampling with a fixed particle count after convergence.
+
+Runs the headless simulation ("Original_mcl - Copy.py") `runs` times with
+KLD-sampling and with --fixed-particles, each in a fresh interpreter seeded
+with the run number so both modes start from the same poses, and
+reports the particle count, time per frame and estimate error over the
+frames after the estimate first came within CONVERGED_ERROR of the rover.
+
+Usage: python benchmark_kld.py [frames] [runs]
+"""
+import sys
+import numpy as np
+from benchmarking import CONVERGED_ERROR, run_simulation
+MODES = (("KLD-sampling", []), ("fixed", ["--fixed-particles"]))
+
+
+def after_convergence(extra_args, frames, seed):
+    """(particles, ms per frame, error) averaged over the converged frames of one run, or None."""
+    frame, fps, particles, error = run_simulation(frames, seed, *extra_args).T
+    frame_ms = np.diff(1000 * frame / fps, prepend=0)  # cumulative frames/s back to per-frame time
+    converged = np.flatnonzero(error < CONVERGED_ERROR)
+    if not converged.size:
+        return None
+    after = slice(converged[0] + 1, None)
+    return particles[after].mean(), np.median(frame_ms[after]), error[after].mean()
+
+
+def main(frames=600, runs=3):
+    results = {}
+    for name, extra_args in MODES:
+        runs_after = [after_convergence(extra_args, frames, seed) for seed in range(runs)]
+        converged = [result for result in runs_after if result is not None]
+        particles, frame_ms, error = np.mean(converged, axis=0)
+        results[name] = frame_ms
+        print(f"{name:>12}: {len(converged)}/{runs} runs converged, then {particles:6.0f} particles, "
+              f"{frame_ms:5.2f} ms/frame, mean error {error:.2f} in")
+    print(f"KLD-sampling takes {results['KLD-sampling'] / results['fixed']:.0%} of the fixed count's frame time")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
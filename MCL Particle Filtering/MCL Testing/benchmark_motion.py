@@ -0,0 +1,42 @@
+"""Time the particle motion update at several set sizes.
+
+The batched update is `update_particles` on a ParticleSet (one noise draw and
+one free-space gather per frame); the per-particle one is the old loop of
+Particle.move, timed on OBJECT_PARTICLES objects and scaled up.
+
+Usage: python benchmark_motion.py [repeats]
+"""
+import sys
+import numpy as np
+import original_mcl_helper_Copy as mh
+from benchmarking import best_time
+
+COUNTS = (5000, 50000, 500000)
+OBJECT_PARTICLES = 5000
+DT = 1 / 60
+
+
+def main(repeats=10):
+    grid = mh.expand_grid(mh.init_grid(), mh.ppi)
+    free_space = mh.FreeSpaceIndex(grid)
+    rover = mh.Rover(free_space)
+    rover.vel_forward, rover.vel_angular = mh.FORWARD_VELOCITY, mh.ANGULAR_VELOCITY
+
+    objects = [mh.Particle(free_space) for _ in range(OBJECT_PARTICLES)]
+
+    def move_objects():
+        for particle in objects:
+            particle.move(rover.vel_forward, rover.vel_angular, DT, grid)
+
+    per_object = best_time(move_objects, max(1, repeats // 5)) / OBJECT_PARTICLES
+
+    for count in COUNTS:
+        for dtype in (np.float64, np.float32):
+            particles = mh.ParticleSet.uniform(free_space, count, dtype)
+            elapsed = best_time(lambda: mh.update_particles(particles, rover, DT, free_space), repeats)
+            print(f"{count:>7} particles, {np.dtype(dtype).name}: {1000 * elapsed:7.2f} ms "
+                  f"({per_object * count / elapsed:.0f}x the Particle.move loop)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
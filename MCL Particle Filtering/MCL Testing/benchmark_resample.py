@@ -0,0 +1,45 @@
+"""Time the resampling stage against the frame budget.
+
+Times each RESAMPLERS index draw on its own and the whole `resample_particles`
+(KLD count, index draw, jitter and free-space check) on sets of random
+weights. For scale, the measurement update of the same set and a 60 frames/s
+frame are shown next to it. KLD-sampling may keep up to the whole set.
+
+Usage: python benchmark_resample.py [repeats]
+"""
+import sys
+import original_mcl_helper_Copy as mh
+from benchmarking import best_time
+from particle_set import RESAMPLERS
+
+COUNTS = (5000, 50000)
+FRAME_BUDGET = 1 / 60  # seconds
+
+
+def main(repeats=10):
+    grid = mh.expand_grid(mh.init_grid(), mh.ppi)
+    free_space = mh.FreeSpaceIndex(grid)
+    scan = mh.Rover(free_space).lidar_scan(grid)
+    mh.sensor_model.warm_up()
+    for count in COUNTS:
+        mh.KLD_MAX_PARTICLES = count
+        particles = mh.ParticleSet.uniform(free_space, count, mh.PARTICLE_DTYPE)
+        particles.update_weights(particles.rng.normal(0, 3, count))
+        weights = particles.normalized_weights()
+        pred_x, pred_y, _ = particles.estimate()
+
+        draws = ", ".join(f"{name} {1000 * best_time(lambda: draw(weights, count, particles.rng), repeats):.2f} ms"
+                          for name, draw in RESAMPLERS.items())
+        weighting = best_time(lambda: mh.weight_particles_beam(mh.ParticleSet(particles.x, particles.y,
+                                                                               particles.theta), scan), repeats)
+        print(f"{count:>6} particles, index draw: {draws}; weight_particles_beam {1000 * weighting:.2f} ms")
+        for adaptive in (False, True):
+            elapsed = best_time(lambda: mh.resample_particles(particles, free_space, pred_x, pred_y, verbose=False,
+                                                              adaptive=adaptive), repeats)
+            label = "KLD-sampling" if adaptive else "fixed count"
+            print(f"{'':>6} resample_particles ({label}): {1000 * elapsed:.2f} ms, "
+                  f"{elapsed / FRAME_BUDGET:.1%} of a frame")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,65 @@
+"""Compare the beam (lookup table) and likelihood-field sensor models.
+
+Reports the memory each model keeps, the time to weight a particle set
+against one rover scan, and how reliably and quickly the headless simulation
+converges with each model from a random start (runs "Original_mcl - Copy.py"
+`runs` times per model in fresh interpreters, seeded with the run number so
+both models see the same starts).
+
+Usage: python benchmark_sensor_models.py [num_particles] [frames] [runs]
+"""
+import sys
+import time
+import numpy as np
+import original_mcl_helper_Copy as mh
+from benchmarking import CONVERGED_ERROR, run_simulation
+
+
+def weigh_beam(particles, field, scan):
+    mh.weight_particles_beam(particles, scan)
+
+
+def weigh_likelihood_field(particles, field, scan):
+    mh.weight_particles_likelihood_field(particles, field, scan)
+
+
+def convergence(sensor_model, frames, seed):
+    """(first frame within CONVERGED_ERROR, mean error, final error, frames/s) of one simulation run."""
+    progress = [(int(frame), fps, error)
+                for frame, fps, _, error in run_simulation(frames, seed, "--sensor-model", sensor_model)]
+    converged = next((frame for frame, _, error in progress if error < CONVERGED_ERROR), None)
+    mean_error = np.mean([error for _, _, error in progress])
+    return converged, mean_error, progress[-1][2], progress[-1][1]
+
+
+def main(num_particles=5000, frames=300, runs=4):
+    grid = mh.expand_grid(mh.init_grid(), mh.ppi)
+    free_space = mh.FreeSpaceIndex(grid)
+    rover = mh.Rover(free_space)
+    scan = rover.lidar_scan(grid)
+
+    table = mh.sensor_model.table
+    field = mh.LikelihoodField(grid, mh.ppi)
+    dense_bytes = grid.size * 360 * 4
+    print(f"Memory: beam table {table.nbytes / 1e6:.1f} MB ({dense_bytes / 1e6:.1f} MB as dense float32), "
+          f"likelihood field {field.nbytes / 1e6:.2f} MB")
+
+    particles = mh.ParticleSet.uniform(free_space, num_particles)
+    for name, weigh in (("beam", weigh_beam), ("likelihood_field", weigh_likelihood_field)):
+        start = time.perf_counter()
+        weigh(particles, field, scan)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>16}: {1000 * elapsed:8.1f} ms to weight {num_particles} particles")
+
+    for name in mh.SENSOR_MODELS:
+        results = [convergence(name, frames, seed) for seed in range(runs)]
+        localized = [result for result in results if result[2] < CONVERGED_ERROR]
+        first_frames = [result[0] for result in localized if result[0] is not None]
+        first = f"first within it at frame {np.median(first_frames):.0f} (median), " if first_frames else ""
+        print(f"{name:>16}: {len(localized)}/{runs} runs end within {CONVERGED_ERROR} in, {first}"
+              f"mean error {np.mean([result[1] for result in results]):.2f} in, "
+              f"{np.mean([result[3] for result in results]):.1f} frames/s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,43 @@
+"""Time building the free-space index and spawning particles uniformly over it.
+
+For reference, also times the Python double loop that used to list the free
+cells, and spawning one Particle object at a time.
+
+Usage: python benchmark_spawn.py [num_particles]
+"""
+import sys
+import time
+import original_mcl_helper_Copy as mh
+
+GRID_PPIS = (5, 12)
+OBJECT_PARTICLES = 5000
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def listed_free_cells(grid):
+    """The [x, y] list of free cells, the old way."""
+    return [[j, i] for i in range(len(grid)) for j in range(len(grid[0])) if grid[i][j] == 0]
+
+
+def main(num_particles=100000):
+    for grid_ppi in GRID_PPIS:
+        grid = mh.expand_grid(mh.init_grid(), grid_ppi)
+        _, listed = timed(lambda: listed_free_cells(grid))
+        free_space, indexed = timed(lambda: mh.FreeSpaceIndex(grid))
+        print(f"ppi {grid_ppi:>2}, {len(free_space)} free cells: index {1000 * indexed:.1f} ms "
+              f"(Python loop {1000 * listed:.0f} ms)")
+
+        _, batched = timed(lambda: mh.ParticleSet.uniform(free_space, num_particles, mh.PARTICLE_DTYPE))
+        _, objects = timed(lambda: [mh.Particle(free_space) for _ in range(OBJECT_PARTICLES)])
+        per_object = objects / OBJECT_PARTICLES * num_particles
+        print(f"        {num_particles} particles: ParticleSet.uniform {1000 * batched:.1f} ms "
+              f"(Particle objects {1000 * per_object:.0f} ms, extrapolated from {OBJECT_PARTICLES})")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,54 @@
+"""Measure the import time of the helper modules and of the lookup table load.
+
+Every measurement runs in a fresh interpreter so nothing is cached in-process.
+
+Usage: python benchmark_startup.py [repeats]
+"""
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).parent
+HELPERS = [
+    (HERE, "original_mcl_helper_Copy"),
+    (HERE.parent / "Lookup Table Generation", "lidar_lookup_helper"),
+]
+BASELINE = "numpy"  # imported by every helper, shown for reference
+
+SNIPPET = """
+import time
+start = time.perf_counter()
+import {module} as helper
+imported = time.perf_counter()
+warm_up = float("nan")
+if hasattr(helper, "sensor_model"):
+    try:
+        helper.sensor_model.warm_up()
+        warm_up = time.perf_counter() - imported
+    except FileNotFoundError:
+        pass
+print(imported - start, warm_up)
+"""
+
+
+def measure(directory, module):
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    result = subprocess.run([sys.executable, "-c", SNIPPET.format(module=module)], cwd=directory,
+                            env=env, capture_output=True, text=True, check=True)
+    import_time, warm_up = result.stdout.split()[-2:]
+    return float(import_time), float(warm_up)
+
+
+def main(repeats=5):
+    for directory, module in [(HERE, BASELINE)] + HELPERS:
+        times = [measure(directory, module) for _ in range(repeats)]
+        import_ms = 1000 * statistics.median(t[0] for t in times)
+        warm_up_ms = 1000 * statistics.median(t[1] for t in times)
+        warm_up = "no table found" if warm_up_ms != warm_up_ms else f"{warm_up_ms:8.1f} ms"
+        print(f"{module:>26}: import {import_ms:8.1f} ms, table warm-up {warm_up}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,67 @@
+"""Time the beam model's measurement update, per particle against batched.
+
+The legacy update is the loop this module replaced, kept here as the
+baseline: 72 scalar reads of the dense table through `normalize_angle` and
+a `normal_pdf` product per particle. The Particle objects row is the same
+loop over today's Particle (vectorized scan, log-space weight). The batched
+update is `weight_particles_beam` over a ParticleSet, which reads every
+particle's beams with one gather per block. Speedups are measured against
+the legacy loop; the target is 50x at 5000 particles.
+
+Usage: python benchmark_weighting.py [repeats]
+"""
+import math
+import sys
+import original_mcl_helper_Copy as mh
+from benchmarking import best_time
+from lidar_table import CompactLookup
+
+PER_PARTICLE_COUNTS = (5000,)
+BATCHED_COUNTS = (5000, 20000, 100000)
+
+
+def legacy_weigh(particles, readings, scan):
+    """The per-beam scan and weight loop of the original helper, weights returned in a list."""
+    sensor_std = mh.MIN_SENSOR_STD + (mh.MAX_SENSOR_STD - mh.MIN_SENSOR_STD) * max(1 - mh.certainty, 0)
+    weights = []
+    for particle in particles:
+        lidar_distances = []
+        for angle in mh.PARTICLE_SCAN_ANGLES:
+            scan_angle = particle.theta * (180 / math.pi) + angle
+            lidar_distances.append(readings[int(particle.x)][int(particle.y)][mh.normalize_angle(scan_angle)])
+        weight = 1.0 / len(particles)
+        for lidar, expected in zip(lidar_distances, scan):
+            weight *= mh.normal_pdf(expected, lidar, sensor_std * mh.ppi)
+        weights.append(weight + 1.e-200)
+    return weights
+
+
+def main(repeats=5):
+    grid = mh.expand_grid(mh.init_grid(), mh.ppi)
+    free_space = mh.FreeSpaceIndex(grid)
+    scan = mh.Rover(free_space).lidar_scan(grid)
+    table = mh.sensor_model.table
+    readings = table.to_dense() if isinstance(table, CompactLookup) else table.table
+
+    legacy = {}
+    for count in PER_PARTICLE_COUNTS:
+        particles = [mh.Particle(free_space) for _ in range(count)]
+
+        def weigh():
+            for particle in particles:
+                particle.update_weight(particle.lidar_scan_fast(), scan)
+
+        legacy[count] = best_time(lambda: legacy_weigh(particles, readings, scan), max(1, repeats // 2))
+        objects = best_time(weigh, max(1, repeats // 2))
+        print(f"      legacy {count:>7}: {1000 * legacy[count]:8.1f} ms")
+        print(f"     objects {count:>7}: {1000 * objects:8.1f} ms ({legacy[count] / objects:.1f}x faster)")
+
+    for count in BATCHED_COUNTS:
+        particles = mh.ParticleSet.uniform(free_space, count, mh.PARTICLE_DTYPE)
+        elapsed = best_time(lambda: mh.weight_particles_beam(particles, scan), repeats)
+        speedup = f", {legacy[count] / elapsed:.0f}x faster" if count in legacy else ""
+        print(f"     batched {count:>7}: {1000 * elapsed:8.1f} ms ({1 / elapsed:.0f} updates/s{speedup})")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,38 @@
+"""Timing and simulation helpers shared by the benchmark scripts."""
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+HERE = Path(__file__).parent
+SIMULATION = HERE / "Original_mcl - Copy.py"
+CONVERGED_ERROR = 2.0  # inches between the estimate and the rover
+# One headless progress line, see the --progress-interval reports of SIMULATION
+PROGRESS = re.compile(r"frame (\d+): ([\d.]+) frames/s, (\d+) particles, estimate error ([\d.]+) in")
+
+
+def best_time(function, repeats):
+    """Shortest of `repeats` wall-clock runs of `function()`, in seconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_simulation(frames, seed, *extra_args):
+    """Run SIMULATION headless in a fresh interpreter and report every frame.
+
+    Returns:
+        np.array: (frames, 4) rows of frame number, cumulative frames/s,
+        particle count and estimate error in inches.
+    """
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    result = subprocess.run([sys.executable, str(SIMULATION), "--headless", "--frames", str(frames),
+                             "--progress-interval", "1e-9", "--seed", str(seed), *extra_args],
+                            cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    return np.array(PROGRESS.findall(result.stdout), dtype=float).reshape(-1, 4)
@@ -0,0 +1,63 @@
+"""Kinematics of the rover's three-wheel holonomic (kiwi) drive.
+
+The firmware (v1_Arduino_Uno_Project_09_Nov_2025.ino) drives three steppers,
+X, Y and Z, under omni wheels 120 degrees apart. Y sits at 0 degrees with
+its rolling direction along the heading's left; X and Z sit at 120 and 240
+degrees. A wheel at angle a rolls
+
+    d_i = -sin(a) * forward + cos(a) * left + WHEEL_BASE_RADIUS * rotation
+
+for a body displacement (forward, left) in inches and a rotation in radians.
+The three equations are inverted once, so step counts map straight to body
+motion. That is how 'w' (X back, Z forward) drives forward and 'a' (Y at
+twice X and Z) slides sideways.
+
+Rotation has the simulation's sign, positive for a positive vel_angular.
+WHEEL_DIAMETER, STEPS_PER_REVOLUTION and WHEEL_BASE_RADIUS are nominal
+values; measure them on the robot.
+"""
+import numpy as np
+
+WHEEL_DIAMETER = 2.0 # inches, omni wheel
+STEPS_PER_REVOLUTION = 200 # full steps of the steppers
+WHEEL_BASE_RADIUS = 4.0 # inches from the rover's center to each wheel
+WHEEL_ANGLES = np.radians([120, 0, 240]) # X, Y, Z
+STEPS_PER_INCH = STEPS_PER_REVOLUTION / (np.pi * WHEEL_DIAMETER)
+
+# Step deltas of the X, Y and Z motors for one firmware command
+STEP_DISTANCE = 4 * 300
+COMMAND_STEPS = {
+    "w": (-STEP_DISTANCE / 20, 0, STEP_DISTANCE / 20), # forward
+    "s": (STEP_DISTANCE / 20, 0, -STEP_DISTANCE / 20), # backward
+    "q": (-STEP_DISTANCE / 24, -STEP_DISTANCE / 24, -STEP_DISTANCE / 24), # rotate left
+    "e": (STEP_DISTANCE / 24, STEP_DISTANCE / 24, STEP_DISTANCE / 24), # rotate right
+    "a": (-STEP_DISTANCE / 8, STEP_DISTANCE / 4, -STEP_DISTANCE / 8), # slide left
+    "d": (STEP_DISTANCE / 8, -STEP_DISTANCE / 4, STEP_DISTANCE / 8), # slide right
+}
+
+# Rows map (forward, left, rotation) to each wheel's rolled distance
+WHEEL_MATRIX = np.column_stack((-np.sin(WHEEL_ANGLES), np.cos(WHEEL_ANGLES),
+                                np.full(3, WHEEL_BASE_RADIUS)))
+BODY_MATRIX = np.linalg.inv(WHEEL_MATRIX)
+
+
+def body_motion(steps):
+    """Body displacement of wheel step deltas.
+
+    Args:
+        steps (array-like): X, Y and Z step deltas, shape (..., 3).
+
+    Returns:
+        np.array: (forward, left, rotation) in inches and radians, shape (..., 3).
+    """
+    return (np.asarray(steps, dtype=float) / STEPS_PER_INCH) @ BODY_MATRIX.T
+
+
+def command_motion(command):
+    """Body displacement (forward, left, rotation) of one firmware command character."""
+    return body_motion(COMMAND_STEPS[command])
+
+
+def wheel_steps(forward, left, rotation):
+    """X, Y and Z step deltas that produce a body displacement, the inverse of `body_motion`."""
+    return WHEEL_MATRIX @ np.array([forward, left, rotation], dtype=float) * STEPS_PER_INCH
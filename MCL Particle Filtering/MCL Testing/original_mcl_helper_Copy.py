@@ -1,9 +1,17 @@
+import sys
 import pygame
-import random
 import math
 import numpy as np
-from filterpy.monte_carlo import stratified_resample
 from pathlib import Path
+# Modules shared by both directories live in ../shared
+SHARED_DIR = str(Path(__file__).resolve().parent.parent / "shared")
+if SHARED_DIR not in sys.path:
+    sys.path.insert(0, SHARED_DIR)
+from lidar_raycast import cast_scan, obstacle_boxes
+from lidar_table import LookupSensorModel, LookupTableCache, interpolated_lookup
+from likelihood_field import LikelihoodField
+from kiwi_drive import body_motion
+from particle_set import FreeSpaceIndex, ParticleSet, RESAMPLERS
 
 # Constants
 GRID_WIDTH = 96 + 2 # inches (one extra inch on each side for border)
@@ -21,6 +29,32 @@ MIN_SENSOR_READING = 3.0 / 2.54
 
 # Simulation parameters
 NUM_PARTICLES = 5000
+# Resample only once the effective sample size drops below this share of the particles
+RESAMPLE_ESS_FRACTION = 0.5
+# KLD-sampling: resampling draws particles until their (x, y, theta) histogram
+# bins bound the KL divergence to the posterior by KLD_EPSILON with 99%
+# confidence (KLD_Z), so the count follows how spread the belief is
+KLD_EPSILON = 0.05
+KLD_Z = 2.326
+KLD_BIN_INCHES = 2.0
+KLD_HEADING_BINS = 24  # 15 degrees
+KLD_MIN_PARTICLES = 200
+KLD_MAX_PARTICLES = NUM_PARTICLES
+RESAMPLING = "stratified"  # key of RESAMPLERS for the fixed count, "systematic" or "stratified"
+# Pose estimate: modes are clusters of an (x, y, theta) histogram; the set has
+# converged once its position spread and strongest mode's weight pass these
+MODE_BIN_INCHES = 4.0
+MODE_HEADING_BINS = 12  # 30 degrees
+NUM_MODES = 3
+CONVERGED_STD_INCHES = 2.0
+CONVERGED_MODE_WEIGHT = 0.9
+PARTICLE_DTYPE = np.float64  # np.float32 halves the particle arrays
+WEIGHT_CHUNK_PARTICLES = 4096  # particles weighted per block, keeps the (block, beams) arrays in cache
+RAYCAST_BACKEND = "march"  # "march" (500 samples per beam), "dda" (exact grid traversal) or "analytic"
+SENSOR_MODELS = ("beam", "likelihood_field")
+SENSOR_MODEL = "beam"  # "beam" compares lookup table ranges, "likelihood_field" scores scan endpoints
+ROVER_SCAN_ANGLES = np.linspace(0, 360, 72) * (math.pi / 180)  # rover lidar beams, relative to its heading
+PARTICLE_SCAN_ANGLES = np.linspace(0, 360, 72)  # degrees, the table beams compared with ROVER_SCAN_ANGLES
 FORWARD_VELOCITY = 4 * ppi  # units per second
 ANGULAR_VELOCITY = math.radians(120)  # 60 degrees per second
 
@@ -28,24 +62,60 @@ ANGULAR_VELOCITY = math.radians(120)  # 60 degrees per second
 MOVEMENT_NOISE = 0.25
 MIN_SENSOR_STD = 0.5
 MAX_SENSOR_STD = 2.5
+# Holonomic drive: noise std of each body motion component (forward, left,
+# rotation) as a share of the commanded one, plus a floor in pixels, pixels
+# and radians
+HOLONOMIC_NOISE_FRACTION = 0.1
+HOLONOMIC_MIN_STD = (0.1 * ppi, 0.1 * ppi, math.radians(1))
 certainty = 0
 
 '''
 with open('sensor_data_12_ppi_15_beam_angle.pkl', 'rb') as f:
     loaded_sensor_readings = pickle.load(f)
 '''
-print("Loading lidar lookup table...")
-data_file = Path(__file__).parent / "lidar_lookup_v2.npz"
-if not data_file.exists():
-    raise FileNotFoundError(f"Data file not found: {data_file!s}")
-# load the compressed .npz file
-with np.load(data_file) as f:
-    # adjust key if needed — typically 'lidar_lookup'
-    if 'lidar_lookup' in f:
-        loaded_sensor_readings = f['lidar_lookup']
-    else:
-        # fallback if it's the only array in the file
-        loaded_sensor_readings = f[list(f.keys())[0]]
+# Lookup table files, the first one that exists and was built for this maze
+# and ppi is loaded. .lut files are memory-mapped instead of decompressed;
+# they and compact tables come from convert_lookup_table.py in "Lookup Table
+# Generation". Without one, a table is built once into LOOKUP_CACHE_DIR.
+# The v2 tables predate table metadata; they hold single rays (LEGACY_BEAM_WIDTH)
+LOOKUP_FILES = ["lidar_lookup_v2.lut", "lidar_lookup_v2_compact.npz", "lidar_lookup_v2.npz"]
+LOOKUP_CACHE_DIR = Path(__file__).parent / "lookup_cache"
+LEGACY_BEAM_WIDTH = 1
+# Degrees covered by each particle beam. Above 1 the table holds the shortest
+# range within the beam (a cone table), the fan of Particle.lidar_scan at
+# lookup cost; 15 matches its sub-rays
+BEAM_WIDTH = 1
+# Pixels per inch of the lookup table, independent of the simulation's ppi.
+# Particle poses are truncated to a table cell and angle bin unless
+# INTERPOLATE_LOOKUP blends the neighbouring cells and bins, which lets a
+# much coarser table (see benchmark_interpolation.py) match a full one
+LOOKUP_PPI = ppi
+INTERPOLATE_LOOKUP = False
+
+# Multi-resolution tables for coarse-to-fine weighting, written by
+# lidar_lookup_generator.py --pyramid
+PYRAMID_FILES = ["lidar_lookup_pyramid.lut"]
+PYRAMID_KEEP_FRACTION = 0.1  # share of the particles scored at a level that are re-scored at the next
+PYRAMID_DROP_PENALTY = 1.0  # log weight kept between dropped particles and those re-scored after them
+
+
+# Obstacles as (row_start, row_stop, col_start, col_stop) in inches, shared by
+# init_grid and the analytic ray caster
+OBSTACLE_RECTS = [
+    # Borders
+    (0, 1, 0, GRID_WIDTH),
+    (GRID_HEIGHT - 1, GRID_HEIGHT, 0, GRID_WIDTH),
+    (0, GRID_HEIGHT, 0, 1),
+    (0, GRID_HEIGHT, GRID_WIDTH - 1, GRID_WIDTH),
+    # Maze obstacles
+    (25, 37, 13, 25),
+    (13, 25, 25, 37),
+    (25, 37, 37, 61),
+    (1, 13, 49, 61),
+    (1, 13, 73, 85),
+    (25, 49, 73, 85),
+]
+OBSTACLE_BOXES = obstacle_boxes(OBSTACLE_RECTS)
 
 
 def init_grid():
@@ -64,20 +134,9 @@ def init_grid():
     grid[16:22, 64:88] = 0
     grid[4:46, 88:94] = 0
 
-    # Set borders as obstacles (1)
-    grid[0, 0:GRID_WIDTH] = 1
-    grid[GRID_HEIGHT - 1, 0:GRID_WIDTH] = 1
-
-    grid[0:GRID_HEIGHT, 0] = 1
-    grid[0:GRID_HEIGHT, GRID_WIDTH - 1] = 1
-
-    # Set obstacles to match maze
-    grid[25:37, 13:25] = 1
-    grid[13:25, 25:37] = 1
-    grid[25:37, 37:61] = 1
-    grid[1:13, 49:61] = 1
-    grid[1:13, 73:85] = 1
-    grid[25:49, 73:85] = 1
+    # Set borders and maze obstacles (1)
+    for row_start, row_stop, col_start, col_stop in OBSTACLE_RECTS:
+        grid[row_start:row_stop, col_start:col_stop] = 1
 
     return grid
 
@@ -97,6 +156,42 @@ def expand_grid(grid, factor):
     return expanded_grid
 
 
+# Sensor data from the same directory as this script (robust to CWD), loaded
+# on the first lookup or by sensor_model.warm_up()
+lookup_cache = LookupTableCache(LOOKUP_CACHE_DIR, init_grid(), LOOKUP_PPI, beam_width=BEAM_WIDTH)
+sensor_model = LookupSensorModel((Path(__file__).parent / name for name in LOOKUP_FILES),
+                                 lookup_cache.metadata, lookup_cache, LEGACY_BEAM_WIDTH)
+# Pyramid levels have their own ppi, everything else must match
+pyramid_model = LookupSensorModel((Path(__file__).parent / name for name in PYRAMID_FILES),
+                                  {key: value for key, value in lookup_cache.metadata.items() if key != "ppi"})
+
+
+def lookup_ranges(x, y, theta, scan_angles):
+    """Lookup table ranges for one or many poses, vectorized over poses and beams.
+
+    Args:
+        x, y, theta (float or np.array): Poses, positions in pixels at ppi and headings in radians.
+        scan_angles (np.array): (B,) beam directions relative to the heading, in degrees.
+
+    Returns:
+        np.array: Ranges in inches, shape (B,) for a single pose or (N, B).
+    """
+    scale = LOOKUP_PPI / ppi
+    # Wrapping the headings first keeps every beam angle below 720 degrees
+    heading = (np.asarray(theta) * (180 / math.pi)) % 360
+    if INTERPOLATE_LOOKUP:
+        beam_angles = (heading[..., None] + scan_angles) % 360
+        return interpolated_lookup(sensor_model.table, np.asarray(x)[..., None] * scale,
+                                   np.asarray(y)[..., None] * scale, beam_angles)
+    # Added in float64: in float32 a heading just below 360 rounds up to it, and
+    # the % 360 covers the 360 degree beam of a heading that wrapped to 360.0
+    angle_bins = (heading[..., None] + scan_angles).astype(np.int32)
+    angle_bins %= 360
+    cell_x = (np.asarray(x) * scale).astype(np.intp)
+    cell_y = (np.asarray(y) * scale).astype(np.intp)
+    return sensor_model.lookup_scans(cell_x, cell_y, angle_bins)
+
+
 def display_grid(reduced_grid):
     for i in range(len(reduced_grid)):
         for j in range(len(reduced_grid[0])):
@@ -109,15 +204,6 @@ def display_grid(reduced_grid):
         print()
         
         
-def create_valid_positions(grid):
-    valid_positions = []
-    for i in range(len(grid)):
-        for j in range(len(grid[0])):
-            if grid[i][j] == 0:
-                valid_positions.append([j, i])
-    return valid_positions
-
-
 def draw_grid(window, grid):
     for y in range(len(grid)):
         for x in range(len(grid[0])):
@@ -139,76 +225,158 @@ def normal_pdf(x, mean, std_dev):
     return coefficient * exponent
 
 
-def particle_variance(particles, weights, pred_x, pred_y):    
-    variance_x = np.average([(p.x - pred_x)**2 / ppi**2 for p in particles], weights = weights)
-    variance_y = np.average([(p.y - pred_y)**2 / ppi**2 for p in particles], weights = weights)
-    
-    # Average the variances to get a single spread measure
-    return (variance_x + variance_y) / 2
-
-def estimate(particles):
-    particles_x = [p.x for p in particles]
-    particles_y = [p.y for p in particles]
-    particles_theta = [p.theta for p in particles]
-    weights = [p.weight for p in particles]
-    mean_x = np.average(particles_x, weights = weights)
-    mean_y = np.average(particles_y, weights = weights)
-    mean_theta = np.average(particles_theta, weights = weights)
-    
-    return mean_x, mean_y, mean_theta
+def summarize(particles):
+    """PoseSummary of a ParticleSet with the MODE_* histogram."""
+    return particles.summary(MODE_BIN_INCHES * ppi, MODE_HEADING_BINS, NUM_MODES)
+
+
+def converged(summary):
+    """Whether a PoseSummary passes CONVERGED_STD_INCHES and CONVERGED_MODE_WEIGHT."""
+    return summary.converged(CONVERGED_STD_INCHES * ppi, CONVERGED_MODE_WEIGHT)
+
+
+def estimate(particles, summary=None):
+    """Pose estimate (x, y, theta): the mean once the set has converged, else its strongest mode."""
+    summary = summarize(particles) if summary is None else summary
+    return summary.pose(CONVERGED_STD_INCHES * ppi, CONVERGED_MODE_WEIGHT)
 
 
 def normalize_angle(angle):
     return int(angle % 360)
 
 
-def resample_particles(particles, grid, valid_positions, pred_x, pred_y):
-    weights = [p.weight for p in particles]
-    total_weight = sum(weights)    
-    # Normalize weights
-    weights = [w / total_weight for w in weights]
-    variance = particle_variance(particles, weights, pred_x, pred_y)
+def resample_particles(particles, free_space, pred_x, pred_y, verbose=True, adaptive=True):
+    """Resample a ParticleSet in proportion to its weights and jitter the survivors.
+
+    With `adaptive` the number of particles comes from KLD-sampling, else the
+    set keeps its size. The jitter shrinks as the filter grows certain.
+
+    Returns:
+        tuple: (new ParticleSet, variance of the old one around (pred_x, pred_y) in square inches)
+    """
+    variance = particles.variance(pred_x, pred_y, ppi)
     certainty = ppi**2 * 2 / (variance)
-    print(f"Certainty: {min(certainty, 1)}")
-    adjusted_num_particles = max(int(NUM_PARTICLES * max(1 - certainty, 0)), 1000)
+    if adaptive:
+        # The KLD candidates are already a weighted draw, so they are resampled as they are
+        indexes = particles.kld_indexes(KLD_BIN_INCHES * ppi, KLD_HEADING_BINS, KLD_EPSILON, KLD_Z,
+                                        KLD_MIN_PARTICLES, KLD_MAX_PARTICLES)
+    else:
+        indexes = RESAMPLERS[RESAMPLING](particles.normalized_weights(), len(particles), particles.rng)
+    particles = particles.resample(indexes)
+    if verbose:
+        print(f"Certainty: {min(certainty, 1)}, {len(particles)} particles")
 
-    # resampling algorithm
-    indexes = stratified_resample(weights)
-        
-    # resample from index
-    particles = [particles[i] for i in indexes[:adjusted_num_particles]]
-    # print(len(particles))
-    
     # Jitter the particles' positions and orientations to keep them close to their original pose
-    def jitter_particle(particle):
-        # Add a small random noise to position (pose.x, pose.y) and orientation (pose.theta)
-        noise_scale = max(1 - certainty, 0)
-        new_x = particle.x + np.random.normal(0, 0.5 + 2 * noise_scale)  # Jitter in x-axis
-        new_y = particle.y + np.random.normal(0, 0.5 + 2 * noise_scale)  # Jitter in y-axis
-        new_theta = particle.theta + np.random.normal(0, 0.1)  # Jitter in orientation
-        
-        # Create a new particle with a similar pose
-        new_particle = Particle(grid, valid_positions)
-        if 0 <= int(new_x) < len(grid[0]) and 0 <= int(new_y) < len(grid) and grid[int(new_y)][int(new_x)] == 0:
-            new_particle.x = new_x
-            new_particle.y = new_y
-        else:
-            new_particle.x = particle.x
-            new_particle.y = particle.y
-        new_particle.theta = new_theta
-        new_particle.weight = 1.0 / len(particles)  # Reset weights to be equal
-        return new_particle
-    
-    # Apply jitter to resampled particles and also add some random jitter for new exploration
-    jittered_particles = [jitter_particle(p) for p in particles]
-    
-    return jittered_particles, variance
+    noise_scale = max(1 - certainty, 0)
+    particles.jitter(0.5 + 2 * noise_scale, 0.1, free_space)
+    return particles, variance
 
 
-def update_particles(particles, rover, dt, grid):
-    """Move particle weights."""
-    for particle in particles:
-        particle.move(rover.vel_forward, rover.vel_angular, dt, grid)
+def weight_particles_beam(particles, expected_distances):
+    """Weight particles by comparing their lookup table ranges with the rover's scan.
+
+    Args:
+        particles (ParticleSet): Particles to weight, updated in place.
+        expected_distances (np.array): The rover's lidar scan in inches, one
+            range per PARTICLE_SCAN_ANGLES beam.
+    """
+    sensor_std = (MIN_SENSOR_STD + (MAX_SENSOR_STD - MIN_SENSOR_STD) * max(1 - certainty, 0)) * ppi
+    expected_distances = np.asarray(expected_distances, dtype=np.float32)
+
+    # The log of the product of the beams' normal_pdf, up to a constant the normalization drops
+    squared_error = np.empty(len(particles))
+    for start in range(0, len(particles), WEIGHT_CHUNK_PARTICLES):
+        block = slice(start, start + WEIGHT_CHUNK_PARTICLES)
+        residual = lookup_ranges(particles.x[block], particles.y[block], particles.theta[block],
+                                 PARTICLE_SCAN_ANGLES) - expected_distances
+        squared_error[block] = np.einsum("ij,ij->i", residual, residual)
+    particles.update_weights(-0.5 * squared_error / sensor_std ** 2)
+
+
+def weight_particles_coarse_to_fine(particles, expected_distances, keep_fraction=PYRAMID_KEEP_FRACTION):
+    """Weight particles against the rover's scan using the lookup table pyramid.
+
+    Every particle is scored at the coarsest level, then only the best
+    `keep_fraction` of those are re-scored at the next finer level, and so on.
+    Most lookups hit the small coarse table, while the particles that matter
+    once the filter has converged are scored at full resolution. A coarse
+    score is not comparable with a finer one, so particles dropped at a
+    level keep their coarse order but are capped PYRAMID_DROP_PENALTY
+    below every particle re-scored after them: none can outweigh one that
+    was refined.
+
+    Args:
+        particles (ParticleSet): Particles to weight, updated in place.
+        expected_distances (np.array): The rover's lidar scan in inches.
+        keep_fraction (float): Share of the particles re-scored at each finer level.
+    """
+    pyramid = pyramid_model.table
+    x = particles.x / ppi
+    y = particles.y / ppi
+    prior = particles.log_weight
+    angle_bins = ((particles.theta[:, None] * (180 / math.pi) + PARTICLE_SCAN_ANGLES) % 360).astype(int)
+    sensor_std = MIN_SENSOR_STD + (MAX_SENSOR_STD - MIN_SENSOR_STD) * max(1 - certainty, 0)
+
+    log_likelihood = np.empty(len(particles))
+    scored = np.arange(len(particles))
+    dropped = []
+    for level, level_ppi in enumerate(pyramid.levels):
+        if level:
+            keep = max(1, int(math.ceil(keep_fraction * scored.size)))
+            order = np.argsort(prior[scored] + log_likelihood[scored])
+            dropped.append(scored[order[:-keep]])
+            scored = scored[order[-keep:]]
+        ranges = pyramid.lookup(level_ppi, x[scored, None], y[scored, None], angle_bins[scored])
+        log_likelihood[scored] = -0.5 * np.sum(((expected_distances - ranges) / (sensor_std * ppi)) ** 2, axis=1)
+
+    # From the finest level down, cap each dropped group below everything scored after it
+    floor = np.min(prior[scored] + log_likelihood[scored])
+    for group in reversed(dropped):
+        if group.size:
+            posterior = np.minimum(prior[group] + log_likelihood[group], floor - PYRAMID_DROP_PENALTY)
+            log_likelihood[group] = posterior - prior[group]
+            floor = posterior.min()
+    particles.update_weights(log_likelihood)
+
+
+def weight_particles_likelihood_field(particles, field, expected_distances):
+    """Weight particles by projecting the rover's scan from each of them into a likelihood field.
+
+    Args:
+        particles (ParticleSet): Particles to weight, updated in place.
+        field (LikelihoodField): Distance field of the expanded grid.
+        expected_distances (np.array): The rover's lidar scan in inches, one
+            range per ROVER_SCAN_ANGLES beam.
+    """
+    # The same sigma the beam model compares its ranges with
+    sensor_std = (MIN_SENSOR_STD + (MAX_SENSOR_STD - MIN_SENSOR_STD) * max(1 - certainty, 0)) * ppi
+    log_likelihood = field.log_likelihood(particles.x, particles.y, particles.theta, expected_distances,
+                                          ROVER_SCAN_ANGLES, sensor_std)
+    particles.update_weights(log_likelihood)
+
+
+def update_particles(particles, rover, dt, free_space):
+    """Move every particle of a ParticleSet with the rover's velocity commands."""
+    particles.move(rover.vel_forward, rover.vel_angular, dt, free_space, MOVEMENT_NOISE, math.radians(2))
+
+
+def holonomic_motion(steps):
+    """Body motion of X, Y, Z wheel step deltas in pixels and radians, and its noise stds."""
+    motion = body_motion(steps) * (ppi, ppi, 1)
+    return motion, HOLONOMIC_NOISE_FRACTION * np.abs(motion) + HOLONOMIC_MIN_STD
+
+
+def update_particles_holonomic(particles, steps, free_space):
+    """Move every particle of a ParticleSet by the kiwi drive motion of X, Y, Z wheel step deltas.
+
+    Args:
+        particles (ParticleSet): Particles to move.
+        steps (array-like): Step deltas of the X, Y and Z motors, e.g.
+            kiwi_drive.COMMAND_STEPS of a firmware command.
+        free_space (FreeSpaceIndex): Free cells of the expanded grid.
+    """
+    motion, std = holonomic_motion(steps)
+    particles.move_body(*motion, free_space, *std)
 
 
 # Helper function to draw orientation lines
@@ -221,21 +389,15 @@ def draw_orientation(window, x, y, theta, length=10, color=BLACK):
 
 # Rover class
 class Rover:
-    def __init__(self, grid, valid_positions):
-        while True:
-            pos = random.choice(valid_positions)
-            self.x = pos[0]
-            self.y = pos[1]
-            if grid[self.y][self.x] == 0:
-                break
-        self.theta = random.uniform(0, 2 * math.pi)
+    def __init__(self, free_space, rng=None):
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.x, self.y, self.theta = free_space.sample_pose(self.rng)
         self.vel_forward = 0
         self.vel_angular = 0
 
     def move(self, dt, grid):
         # Apply noise to movement
-        forward_noise = random.gauss(0, MOVEMENT_NOISE)
-        angular_noise = random.gauss(0, math.radians(2))
+        forward_noise, angular_noise = self.rng.normal(0, (MOVEMENT_NOISE, math.radians(2)))
 
         # Calculate proposed new position
         new_x = self.x + (self.vel_forward + forward_noise) * math.cos(self.theta) * dt
@@ -247,89 +409,43 @@ class Rover:
             self.x = new_x
             self.y = new_y
         self.theta = new_theta
-    
-    def lidar_scan(self, grid):
-        """Simulate a lidar scan with a 180-degree beam width for the rover,
-        using a 15-degree beam width (fan) for each scan angle."""
-        num_scan_angles = 72
-        scan_angles = np.linspace(0, 360, num_scan_angles) * (math.pi / 180)  # Main scan angles
-        #beam_half_angle = 7.5 * (math.pi / 180)  # Half of 15 degrees in radians
-        lidar_distances = np.zeros(num_scan_angles)
-
-        for index, angle in enumerate(scan_angles):
-            scan_angle = self.theta + angle
-            sensor_x = self.x + 3.0 * ppi * math.cos(scan_angle)
-            sensor_y =  self.y + 3.0 * ppi * math.sin(scan_angle)
-            
-            # Fan out with multiple scan lines within ±7.5 degrees
-            num_beams = 1
-            #beam_angles = np.linspace(scan_angle - beam_half_angle, scan_angle + beam_half_angle, num_beams)
-
-            # Track the shortest distance found within this beam
-            min_distance = MAX_SENSOR_READING
-            hit_found = False
-
-            #for beam_angle in beam_angles:
-            for dist in np.linspace(0, (MAX_SENSOR_READING) * ppi, 500):  # High-resolution scan range
-                scan_x = dist * math.cos(scan_angle) + sensor_x
-                scan_y = dist * math.sin(scan_angle) + sensor_y
-
-                # Check for boundaries or obstacles
-                if 0 <= int(scan_x) < len(grid[0]) and 0 <= int(scan_y) < len(grid):
-                    if grid[int(scan_y)][int(scan_x)] == 1:  # Hit an obstacle
-                        # Return the exact pixel point for the lidar
-                        boundary_x = int(scan_x)
-                        boundary_y = int(scan_y)
-                        lidar_distance = math.sqrt((boundary_x - sensor_x)**2 + (boundary_y - sensor_y)**2)
-
-                        # Keep track of the closest hit distance within this beam
-                        min_distance = min(min_distance, lidar_distance / float(ppi))
-                        hit_found = True
-                        break  # Stop scanning further in this direction
-                # If no obstacle was found within the beam angle, move to the next one
-
-            # Append the shortest distance found for this scan angle
-            if hit_found:
-                # lidar_distances.append(max(min_distance, MIN_SENSOR_READING))
-                lidar_distances[index] = max(min_distance, MIN_SENSOR_READING)
-                # lidar_distances[index] = min_distance
-            else:
-                # No obstacle found within the beam
-                lidar_distances[index] = MAX_SENSOR_READING
-                # lidar_distances.append(MAX_SENSOR_READING)
 
-        return lidar_distances   
+    def move_steps(self, steps, grid):
+        """Drive X, Y, Z wheel step deltas with the noise the holonomic particle model assumes."""
+        motion, std = holonomic_motion(steps)
+        forward, left, rotation = self.rng.normal(motion, std)
+        heading = self.theta + rotation / 2
+        new_x = self.x + forward * math.cos(heading) + left * math.sin(heading)
+        new_y = self.y + forward * math.sin(heading) - left * math.cos(heading)
+        if 0 <= int(new_x) < len(grid[0]) and 0 <= int(new_y) < len(grid) and grid[int(new_y)][int(new_x)] == 0:
+            self.x = new_x
+            self.y = new_y
+        self.theta += rotation
+    
+    def lidar_scan(self, grid, backend=RAYCAST_BACKEND):
+        """Simulate a 72-beam lidar scan for the rover."""
+        scene = OBSTACLE_BOXES if backend == "analytic" else grid
+        return cast_scan(scene, self.x, self.y, self.theta + ROVER_SCAN_ANGLES, ppi, backend=backend)
     
     def lidar_scan_fast(self):
         """Simulate a lidar scan with a 180-degree beam width for the particle,
         using a 15-degree beam width (fan) for each scan angle."""
         # scan_angles = np.linspace(0, 359, 360) * (math.pi / 180)  # Main scan angles
         scan_angles = np.linspace(0, 360, 73)  # Main scan angles
-        lidar_distances = []  # List to hold shortest lidar hit distance for each scan angle
-
-        for angle in scan_angles:
-            scan_angle = self.theta * (180 / math.pi) + angle
-            lidar_distances.append(loaded_sensor_readings[int(self.x)][int(self.y)][normalize_angle(scan_angle)])
-        
-        return lidar_distances
+        return lookup_ranges(self.x, self.y, self.theta, scan_angles)
     
 
-# Particle class
+# Particle class, one particle with its own scans; the filter keeps its
+# particles in a ParticleSet
 class Particle:
-    def __init__(self, grid, valid_positions):
-        while True:
-            pos = random.choice(valid_positions)
-            self.x = pos[0]
-            self.y = pos[1]
-            if grid[self.y][self.x] == 0:
-                break
-        self.theta = random.uniform(0, 2 * math.pi)
-        self.weight = 1.0 / NUM_PARTICLES
+    def __init__(self, free_space, rng=None):
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.x, self.y, self.theta = free_space.sample_pose(self.rng)
+        self.log_weight = -math.log(max(NUM_PARTICLES, 1))
 
     def move(self, forward_velocity, angular_velocity, dt, grid):
         # Add movement noise
-        forward_noise = random.gauss(0, MOVEMENT_NOISE)
-        angular_noise = random.gauss(0, math.radians(2))
+        forward_noise, angular_noise = self.rng.normal(0, (MOVEMENT_NOISE, math.radians(2)))
 
         # Calculate new position
         new_x = self.x + (forward_velocity + forward_noise) * math.cos(self.theta) * dt
@@ -343,69 +459,23 @@ class Particle:
         self.theta = new_theta
         
     def update_weight(self, lidar_distances, expected_distances):
-        """Update particle weight based on the lidar readings."""
-        # Calculate how closely the lidar readings match expected points     
-        sensor_std = MIN_SENSOR_STD + (MAX_SENSOR_STD - MIN_SENSOR_STD) * max(1 - certainty, 0)
+        """Add the log likelihood of the lidar readings to the particle's log weight."""
+        # The log of each beam's normal_pdf, up to a constant the normalization drops, so it cannot underflow
+        sensor_std = (MIN_SENSOR_STD + (MAX_SENSOR_STD - MIN_SENSOR_STD) * max(1 - certainty, 0)) * ppi
         for lidar, expected in zip(lidar_distances, expected_distances):
-            self.weight *= normal_pdf(expected, lidar, sensor_std * ppi)
-        self.weight += 1.e-200
+            self.log_weight -= 0.5 * ((expected - lidar) / sensor_std) ** 2
 
-    def lidar_scan(self, grid):
+    def lidar_scan(self, grid, backend=RAYCAST_BACKEND):
         """Simulate 15 degree beam angle"""
         scan_angles = np.linspace(0, 359, 360) * (math.pi / 180)  # Main scan angles
         beam_half_angle = 7.5 * (math.pi / 180)  # Half of 15 degrees in radians
-        lidar_distances = []  # List to hold shortest lidar hit distance for each scan angle
-
-        for angle in scan_angles:
-            scan_angle = self.theta + angle
-            sensor_x = self.x + 3.0 * ppi * math.cos(scan_angle)
-            sensor_y =  self.y + 3.0 * ppi * math.sin(scan_angle)
-            
-            # Fan out with multiple scan lines within Â±12.5 degrees
-            beam_angles = np.linspace(scan_angle - beam_half_angle, scan_angle + beam_half_angle, 10)
-
-            # Track the shortest distance found within this beam
-            min_distance = MAX_SENSOR_READING
-            hit_found = False
-
-            for beam_angle in beam_angles:
-                for dist in np.linspace(0, (MAX_SENSOR_READING) * ppi, 500):  # High-resolution scan range
-                    scan_x = dist * math.cos(beam_angle) + sensor_x
-                    scan_y = dist * math.sin(beam_angle) + sensor_y
-
-                    # Check for boundaries or obstacles
-                    if 0 <= int(scan_x) < len(grid[0]) and 0 <= int(scan_y) < len(grid):
-                        if grid[int(scan_y)][int(scan_x)] == 1:  # Hit an obstacle
-                            # Return the exact pixel point for the lidar
-                            boundary_x = int(scan_x)
-                            boundary_y = int(scan_y)
-                            lidar_distance = math.sqrt((boundary_x - sensor_x)**2 + (boundary_y - sensor_y)**2)
-
-                            # Keep track of the closest hit distance within this beam
-                            min_distance = min(min_distance, lidar_distance / float(ppi))
-                            hit_found = True
-                            break  # Stop scanning further in this direction
-                # If no obstacle was found within the beam angle, move to the next one
-
-            # Append the shortest distance found for this scan angle
-            if hit_found:
-                lidar_distances.append(max(min_distance, MIN_SENSOR_READING))
-            else:
-                # No obstacle found within the beam; use -1 to indicate max range
-                lidar_distances.append(MAX_SENSOR_READING)
-
-        return lidar_distances
+        beam_offsets = np.linspace(-beam_half_angle, beam_half_angle, 10)
+        scene = OBSTACLE_BOXES if backend == "analytic" else grid
+        return cast_scan(scene, self.x, self.y, self.theta + scan_angles, ppi, beam_offsets, backend)
     
     
     def lidar_scan_fast(self):
         """Simulate a lidar scan with a 180-degree beam width for the particle,
         using a 15-degree beam width (fan) for each scan angle."""
         # scan_angles = np.linspace(0, 359, 360) * (math.pi / 180)  # Main scan angles
-        scan_angles = np.linspace(0, 360, 72)  # Main scan angles
-        lidar_distances = []  # List to hold shortest lidar hit distance for each scan angle
-
-        for angle in scan_angles:
-            scan_angle = self.theta * (180 / math.pi) + angle
-            lidar_distances.append(loaded_sensor_readings[int(self.x)][int(self.y)][normalize_angle(scan_angle)])
-        
-        return lidar_distances
\ No newline at end of file
+        return lookup_ranges(self.x, self.y, self.theta, PARTICLE_SCAN_ANGLES)
\ No newline at end of file
@@ -0,0 +1,467 @@
+"""Particle filter state kept as arrays.
+
+A `ParticleSet` holds the x, y, theta and log weight of every particle in
+contiguous NumPy arrays, so moving, weighting, estimating and resampling are
+array expressions over the whole set instead of Python loops over Particle
+objects. Iterating a set (or indexing one particle) yields `ParticleView`s
+with the old Particle attributes, for drawing.
+
+Weights are kept as normalized logarithms: the product of dozens of beam
+likelihoods underflows as a plain float, its log does not. Every random draw
+takes an explicit np.random.Generator, so a seeded one reproduces a run.
+"""
+import numpy as np
+
+
+class FreeSpaceIndex:
+    """The free (0) cells of an expanded grid, built once for membership tests and uniform sampling.
+
+    Attributes:
+        mask (np.array): (height, width) bool, True on free cells.
+        cells (np.array): Flat (row-major) indexes of the free cells.
+    """
+
+    def __init__(self, grid):
+        self.mask = np.asarray(grid) == 0
+        self.cells = np.flatnonzero(self.mask)
+
+    def __len__(self):
+        return self.cells.size
+
+    def contains(self, x, y):
+        """True where the positions x, y in pixels fall on a free cell."""
+        height, width = self.mask.shape
+        x, y = np.asarray(x), np.asarray(y)
+        cell_x = x.astype(np.intp)  # truncation, the x >= 0 test below rejects (-1, 0)
+        cell_y = y.astype(np.intp)
+        inside = (x >= 0) & (cell_x < width) & (y >= 0) & (cell_y < height)
+        return inside & self.mask.reshape(-1).take(np.where(inside, cell_y * width + cell_x, 0))
+
+    def sample_poses(self, count, rng):
+        """`count` poses uniform over the free space, positions in pixels and headings in radians."""
+        cell_y, cell_x = np.divmod(self.cells[rng.integers(self.cells.size, size=count)], self.mask.shape[1])
+        offset_x, offset_y, turn = rng.random((3, count))
+        return cell_x + offset_x, cell_y + offset_y, 2 * np.pi * turn
+
+    def sample_pose(self, rng):
+        """One pose from `sample_poses`, as floats."""
+        return tuple(float(value[0]) for value in self.sample_poses(1, rng))
+
+
+def logsumexp(values):
+    """log(sum(exp(values))) without overflow or underflow."""
+    peak = values.max()
+    return peak + np.log(np.exp(values - peak).sum())
+
+
+def kld_sample_size(num_bins, epsilon, z):
+    """Particles needed for a KLD-sampling bound (Fox, 2003).
+
+    With that many samples the KL divergence between the sample-based and the
+    true posterior stays below `epsilon` with the probability whose standard
+    normal quantile is `z`, given the number of occupied histogram bins.
+
+    Args:
+        num_bins (array-like): Occupied bins.
+        epsilon (float): Bound on the KL divergence.
+        z (float): Upper standard normal quantile of the confidence, 2.326 for 99%.
+
+    Returns:
+        np.array: Required sample sizes, 0 for a single bin.
+    """
+    k = np.maximum(np.asarray(num_bins, dtype=float) - 1, 1)
+    a = 2 / (9 * k)
+    return np.where(np.asarray(num_bins) > 1, k / (2 * epsilon) * (1 - a + np.sqrt(a) * z) ** 3, 0)
+
+
+def systematic_indexes(weights, count, rng):
+    """Indexes drawn with one random offset shared by `count` evenly spaced positions.
+
+    Args:
+        weights (np.array): Normalized weights.
+        count (int): Number of draws.
+        rng (np.random.Generator): Source of the offset.
+    """
+    return _draw(weights, np.full(count, rng.random()))
+
+
+def stratified_indexes(weights, count, rng):
+    """Indexes drawn with one random position in each of `count` equal strata."""
+    return _draw(weights, rng.random(count))
+
+
+def _draw(weights, offsets):
+    """Sorted indexes of the positions (j + offsets[j]) / count on the cumulative weights.
+
+    The positions are sorted and one falls in each stratum [j, j + 1) / count,
+    so the number below a cumulative weight c is floor(c * count), plus one if
+    that stratum's offset is below the fraction left over. Counting that for
+    every particle and repeating its index that many times is O(N), with no
+    binary search.
+    """
+    count = offsets.size
+    cumulative = np.cumsum(weights)
+    scaled = cumulative * (count / cumulative[-1])
+    below = np.minimum(scaled.astype(np.intp), count)
+    below += (below < count) & (offsets.take(np.minimum(below, count - 1)) < scaled - below)
+    below[-1] = count  # the last cumulative weight is the total, up to rounding
+    return np.repeat(np.arange(len(weights)), np.diff(below, prepend=0))
+
+
+RESAMPLERS = {"systematic": systematic_indexes, "stratified": stratified_indexes}
+
+
+def wrap_angle(angle):
+    """Angles in radians wrapped to [-pi, pi], by whole turns (cheaper than a float %)."""
+    return angle - (2 * np.pi) * np.round(angle * (1 / (2 * np.pi)))
+
+
+class ParticleView:
+    """One particle of a ParticleSet; its attributes read and write the set's arrays."""
+
+    __slots__ = ("particles", "index")
+
+    def __init__(self, particles, index):
+        self.particles = particles
+        self.index = index
+
+    def _field(name):
+        def get(self):
+            return getattr(self.particles, name)[self.index]
+
+        def set(self, value):
+            getattr(self.particles, name)[self.index] = value
+
+        return property(get, set)
+
+    x = _field("x")
+    y = _field("y")
+    theta = _field("theta")
+    log_weight = _field("log_weight")
+    del _field
+
+    @property
+    def weight(self):
+        return np.exp(self.log_weight)
+
+
+class PoseSummary:
+    """Weighted statistics of a ParticleSet, from `ParticleSet.summary`.
+
+    Attributes:
+        x, y, theta (float): Weighted mean pose, the heading a circular mean in [0, 2pi).
+        covariance (np.array): 3x3 weighted covariance of (x, y, theta) in pixels and
+            radians, with the heading residuals wrapped around `theta`.
+        heading_concentration (float): Length of the weighted mean heading vector, 1 when
+            every particle points the same way and near 0 when the headings spread round.
+        modes (np.array): (weight, x, y, theta) rows of the strongest histogram clusters,
+            strongest first. The weights are shares of the whole set.
+        effective_sample_size (float): See `ParticleSet.effective_sample_size`.
+    """
+
+    def __init__(self, x, y, theta, covariance, heading_concentration, modes, effective_sample_size):
+        self.x = x
+        self.y = y
+        self.theta = theta
+        self.covariance = covariance
+        self.heading_concentration = heading_concentration
+        self.modes = modes
+        self.effective_sample_size = effective_sample_size
+
+    @property
+    def position_std(self):
+        """Weighted position spread in pixels, averaged over x and y."""
+        return float(np.sqrt((self.covariance[0, 0] + self.covariance[1, 1]) / 2))
+
+    @property
+    def heading_std(self):
+        """Circular standard deviation of the heading in radians."""
+        return float(np.sqrt(-2 * np.log(max(self.heading_concentration, 1e-12))))
+
+    def converged(self, max_position_std, min_mode_weight):
+        """Whether the set is one tight cluster, to gate work that only pays off once it is.
+
+        Args:
+            max_position_std (float): Largest `position_std` in pixels.
+            min_mode_weight (float): Smallest share of the weight in the strongest mode.
+        """
+        return self.position_std <= max_position_std and self.modes[0, 0] >= min_mode_weight
+
+    def pose(self, max_position_std, min_mode_weight):
+        """The mean pose once `converged`, else the strongest mode's.
+
+        The mean of separate clusters can fall between them, where no particle is.
+        """
+        if self.converged(max_position_std, min_mode_weight):
+            return self.x, self.y, self.theta
+        return tuple(float(value) for value in self.modes[0, 1:])
+
+
+class ParticleSet:
+    """Poses and weights of a particle filter.
+
+    Args:
+        x, y, theta (array-like): Poses, positions in pixels and headings in radians.
+        log_weight (array-like, optional): Log weights, uniform by default; they are normalized.
+        dtype: Float dtype of the arrays; np.float32 halves their memory.
+        rng (np.random.Generator, optional): Source of every draw for the set, an
+            unseeded one by default. Sets made by `resample` share it.
+    """
+
+    def __init__(self, x, y, theta, log_weight=None, dtype=np.float64, rng=None):
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.x = np.array(x, dtype=dtype)
+        self.y = np.array(y, dtype=dtype)
+        self.theta = np.array(theta, dtype=dtype)
+        if log_weight is None:
+            self.log_weight = np.full(self.x.size, -np.log(max(self.x.size, 1)), dtype=dtype)
+        else:
+            self.log_weight = np.array(log_weight, dtype=dtype)
+            self.update_weights(0.0)
+
+    @classmethod
+    def uniform(cls, free_space, num_particles, dtype=np.float64, rng=None):
+        """Particles spread uniformly over the free space with random headings.
+
+        Args:
+            free_space (FreeSpaceIndex): Free cells of the expanded grid.
+            num_particles (int): Size of the set.
+            dtype, rng: See the class.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        return cls(*free_space.sample_poses(num_particles, rng), dtype=dtype, rng=rng)
+
+    def __len__(self):
+        return self.x.size
+
+    def __getitem__(self, index):
+        return ParticleView(self, index)
+
+    def __iter__(self):
+        return (ParticleView(self, index) for index in range(len(self)))
+
+    @property
+    def dtype(self):
+        return self.x.dtype
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes + self.theta.nbytes + self.log_weight.nbytes
+
+    @property
+    def weight(self):
+        """The normalized weights."""
+        return np.exp(self.log_weight)
+
+    def normalized_weights(self):
+        """The weights as float64 summing to 1."""
+        weight = np.exp(self.log_weight.astype(np.float64))
+        return weight / weight.sum()
+
+    def effective_sample_size(self):
+        """1 / sum(w^2) of the normalized weights.
+
+        len(self) while the weights are uniform, down to 1 when one particle holds them all.
+        """
+        log_weight = self.log_weight.astype(np.float64)
+        return float(np.exp(-logsumexp(2 * log_weight)))
+
+    def move(self, forward_velocity, angular_velocity, dt, free_space, forward_std, angular_std):
+        """Drive every particle with its own velocity noise, like Particle.move.
+
+        The noise for all particles comes from one draw of `rng`, and the new
+        positions are checked with one gather into the free-space mask. A
+        particle whose new position leaves the free space keeps its position
+        but still turns.
+
+        Args:
+            forward_velocity (float): Pixels per second along the heading.
+            angular_velocity (float): Radians per second.
+            dt (float): Time step in seconds.
+            free_space (FreeSpaceIndex): Free cells of the expanded grid.
+            forward_std, angular_std (float): Standard deviations of the velocity noise.
+        """
+        noise = self.rng.standard_normal((2, len(self)), dtype=self.dtype)
+        step = (forward_velocity + forward_std * noise[0]) * dt
+        new_x = self.x + step * np.cos(self.theta)
+        new_y = self.y + step * np.sin(self.theta)
+        free = free_space.contains(new_x, new_y)
+        np.copyto(self.x, new_x, where=free)
+        np.copyto(self.y, new_y, where=free)
+        self.theta += (angular_velocity + angular_std * noise[1]) * dt
+
+    def move_body(self, forward, left, rotation, free_space, forward_std, left_std, rotation_std):
+        """Displace every particle in its own body frame, for a holonomic drive.
+
+        Each particle moves `forward` along its heading and `left` across it
+        (screen coordinates, y down), both taken at the heading halfway
+        through the `rotation`, with its own noise on all three. Collisions
+        are handled as in `move`.
+
+        Args:
+            forward, left (float): Body displacement in pixels.
+            rotation (float): Heading change in radians.
+            free_space (FreeSpaceIndex): Free cells of the expanded grid.
+            forward_std, left_std, rotation_std (float): Standard deviations of the noise.
+        """
+        noise = self.rng.standard_normal((3, len(self)), dtype=self.dtype)
+        step_forward = forward + forward_std * noise[0]
+        step_left = left + left_std * noise[1]
+        turn = rotation + rotation_std * noise[2]
+        heading = self.theta + turn / 2
+        cos_heading, sin_heading = np.cos(heading), np.sin(heading)
+        new_x = self.x + step_forward * cos_heading + step_left * sin_heading
+        new_y = self.y + step_forward * sin_heading - step_left * cos_heading
+        free = free_space.contains(new_x, new_y)
+        np.copyto(self.x, new_x, where=free)
+        np.copyto(self.y, new_y, where=free)
+        self.theta += turn
+
+    def update_weights(self, log_likelihood):
+        """Multiply the weights by each particle's likelihood, given as its log, and normalize them."""
+        log_weight = self.log_weight.astype(np.float64) + log_likelihood
+        self.log_weight[:] = log_weight - logsumexp(log_weight)
+
+    def estimate(self):
+        """Weighted mean pose (x, y, theta), the heading a circular mean in [0, 2pi)."""
+        weight = self.normalized_weights()
+        mean_theta = np.arctan2(weight @ np.sin(self.theta), weight @ np.cos(self.theta)) % (2 * np.pi)
+        return float(weight @ self.x), float(weight @ self.y), float(mean_theta)
+
+    def variance(self, pred_x, pred_y, ppi):
+        """Weighted squared distance from (pred_x, pred_y) in square inches, averaged over x and y."""
+        weight = self.normalized_weights()
+        variance_x = weight @ (self.x - pred_x) ** 2
+        variance_y = weight @ (self.y - pred_y) ** 2
+        return float(variance_x + variance_y) / (2 * ppi ** 2)
+
+    def summary(self, bin_size, num_heading_bins, num_modes):
+        """Mean pose, covariance, modes and convergence metrics of the set in O(N).
+
+        The modes come from an (x, y, theta) histogram. Bins next to a
+        stronger one (by position and heading) are merged into its mode, so a
+        cluster straddling bin edges counts once, and each mode's pose is the
+        weighted mean of its particles.
+
+        Args:
+            bin_size (float): Side of the position bins in pixels.
+            num_heading_bins (int): Bins over the full turn.
+            num_modes (int): Most modes to return.
+
+        Returns:
+            PoseSummary: Statistics of the current weights.
+        """
+        weight = self.normalized_weights()
+        cos, sin = np.cos(self.theta), np.sin(self.theta)
+        mean_cos, mean_sin = weight @ cos, weight @ sin
+        mean_x, mean_y = weight @ self.x, weight @ self.y
+        mean_theta = np.arctan2(mean_sin, mean_cos) % (2 * np.pi)
+        residuals = (self.x - mean_x, self.y - mean_y, wrap_angle(self.theta - mean_theta))
+        covariance = np.empty((3, 3))
+        for i, residual in enumerate(residuals):
+            weighted = weight * residual
+            for j in range(i + 1):
+                covariance[i, j] = covariance[j, i] = weighted @ residuals[j]
+
+        # Per-bin weight and weighted pose sums, then the strongest bins
+        keys = self.bin_keys(bin_size, num_heading_bins)
+        bin_weight = np.bincount(keys, weight)
+        candidates = np.flatnonzero(bin_weight)
+        if candidates.size > 4 * num_modes:
+            candidates = candidates[np.argpartition(bin_weight[candidates], -4 * num_modes)[-4 * num_modes:]]
+        candidates = candidates[np.argsort(bin_weight[candidates])[::-1]]
+        # (weight, x, y, cos, sin) sums of each candidate bin, merged into the
+        # stronger mode they sit next to
+        sums = np.stack([bin_weight[candidates]] + [np.bincount(keys, weight * value)[candidates]
+                                                    for value in (self.x, self.y, cos, sin)], axis=1)
+        bin_x, bin_y = sums[:, 1:3].T / sums[:, 0]
+        bin_theta = np.arctan2(sums[:, 4], sums[:, 3])
+        mode_bins = []
+        mode_sums = []
+        for i in range(candidates.size):
+            for j, first in enumerate(mode_bins):
+                near = np.hypot(bin_x[i] - bin_x[first], bin_y[i] - bin_y[first]) < 1.5 * bin_size
+                turn = abs(wrap_angle(bin_theta[i] - bin_theta[first])) < 3 * np.pi / num_heading_bins
+                if near and turn:
+                    mode_sums[j] = mode_sums[j] + sums[i]
+                    break
+            else:
+                if len(mode_bins) < num_modes:
+                    mode_bins.append(i)
+                    mode_sums.append(sums[i])
+        mode_sums = np.array(mode_sums)
+        modes = np.column_stack((mode_sums[:, 0], mode_sums[:, 1:3] / mode_sums[:, :1],
+                                 np.arctan2(mode_sums[:, 4], mode_sums[:, 3]) % (2 * np.pi)))
+        modes = modes[np.argsort(modes[:, 0])[::-1]]
+
+        return PoseSummary(float(mean_x), float(mean_y), float(mean_theta), covariance,
+                           float(np.hypot(mean_cos, mean_sin)), modes, 1.0 / float(weight @ weight))
+
+    def bin_keys(self, bin_size, num_heading_bins):
+        """Integer key of every particle's (x, y, theta) histogram bin.
+
+        Args:
+            bin_size (float): Side of the position bins in pixels.
+            num_heading_bins (int): Bins over the full turn.
+        """
+        cell_x = np.floor(self.x / bin_size).astype(np.int64)
+        cell_y = np.floor(self.y / bin_size).astype(np.int64)
+        heading = np.floor(self.theta * (num_heading_bins / (2 * np.pi))).astype(np.int64) % num_heading_bins
+        return (cell_x * (cell_y.max() + 1) + cell_y) * num_heading_bins + heading
+
+    def kld_indexes(self, bin_size, num_heading_bins, epsilon, z, min_count, max_count):
+        """Indexes to resample, as many as the KLD-sampling bound asks for.
+
+        KLD-sampling draws particles in proportion to their weights until
+        there are at least `kld_sample_size` of the bins they occupy. Here all
+        `max_count` candidates are drawn at once (a shuffled stratified draw,
+        so every prefix is a fair sample), the occupied bins of every prefix
+        are counted in one O(N) pass over a dense first-occurrence array of
+        the bounded bin keys, and the shortest prefix that satisfies the
+        bound is returned. A concentrated set therefore keeps few particles
+        and a spread one up to `max_count`.
+
+        Args:
+            bin_size, num_heading_bins: Histogram, see `bin_keys`.
+            epsilon, z: Bound, see `kld_sample_size`.
+            min_count, max_count (int): Limits of the count.
+
+        Returns:
+            np.array: The indexes, in random order.
+        """
+        candidates = stratified_indexes(self.normalized_weights(), max_count, self.rng)
+        self.rng.shuffle(candidates)
+
+        keys = self.bin_keys(bin_size, num_heading_bins)[candidates]
+        # Position of each bin's first candidate: written back to front, the earliest write lands last
+        order = np.arange(max_count)
+        first = np.empty(keys.max() + 1, dtype=np.intp)
+        first[keys[::-1]] = order[::-1]
+        occupied = np.cumsum(first[keys] == order)
+        # The bound for each possible number of bins, looked up for every prefix
+        needed = np.maximum(kld_sample_size(np.arange(occupied[-1] + 1), epsilon, z), min_count)[occupied]
+        enough = order + 1 >= needed
+        return candidates[:int(np.argmax(enough)) + 1] if enough.any() else candidates
+
+    def resample(self, indexes):
+        """New set of the particles at `indexes` (repeats allowed), with uniform weights."""
+        return ParticleSet(self.x[indexes], self.y[indexes], self.theta[indexes],
+                           dtype=self.dtype, rng=self.rng)
+
+    def jitter(self, position_std, heading_std, free_space):
+        """Add Gaussian noise to every pose, keeping the old position where the new one is not free.
+
+        Args:
+            position_std (float): Standard deviation of the x and y noise in pixels.
+            heading_std (float): Standard deviation of the heading noise in radians.
+            free_space (FreeSpaceIndex): Free cells of the expanded grid.
+        """
+        noise = self.rng.standard_normal((3, len(self)), dtype=self.dtype)
+        noise *= np.array([position_std, position_std, heading_std], dtype=self.dtype)[:, None]
+        new_x, new_y, turn = noise
+        new_x += self.x
+        new_y += self.y
+        free = free_space.contains(new_x, new_y)
+        np.copyto(self.x, new_x, where=free)
+        np.copyto(self.y, new_y, where=free)
+        self.theta += turn
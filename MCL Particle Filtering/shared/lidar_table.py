@@ -0,0 +1,691 @@
+"""Lidar lookup table formats.
+
+A lookup table holds the simulated lidar range, in inches, for every grid cell
+and integer heading: `table[x][y][angle]`. Two in-memory forms share the same
+`lookup(x, y, angle)` API:
+
+* `DenseLookup` wraps the full (width, height, 360) float32 array written by
+  lidar_lookup_generator.py.
+* `CompactLookup` stores only free cells, found through a dense cell index,
+  with ranges quantized to uint8/uint16 fixed point and a stored scale. At
+  ppi=12 it is about 11x smaller than the dense table with uint8 ranges.
+
+Cells that are not stored read as 0, like the unvisited cells of a dense table.
+`interpolated_lookup` reads either form at continuous positions and headings.
+`LookupPyramid` holds tables of the same map at several resolutions.
+
+Any of them can be saved to a `.lut` file: an uncompressed container with a
+JSON header describing each array (dtype, shape, byte offset). `open_table`
+maps the arrays with np.memmap instead of reading them, so opening is near
+instant, pages are loaded on first access and every process on a machine
+that opens the same file shares the same physical pages.
+
+`cone_table` derives a beam-width-aware table from a single-ray one: each
+angle holds the shortest range within a beam that many degrees wide, like
+the sub-ray fan of `Particle.lidar_scan`.
+
+Generated tables carry metadata (`table_metadata`): a hash of the maze from
+`init_grid`, the ppi, angle count, beam width, sensor offset, range limits
+and generator version. `LookupTableCache` builds and keeps a table for each configuration,
+named after a digest of that metadata.
+
+`LookupSensorModel` defers finding and loading a table until the first
+query, so importing a helper module costs nothing for tools that never
+touch the table. It skips tables whose metadata does not match the caller's
+configuration and falls back to the cache.
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import zipfile
+from pathlib import Path
+import numpy as np
+from lidar_raycast import MAX_SENSOR_READING, MIN_SENSOR_READING, SENSOR_OFFSET, sweep_ranges
+
+QUANTIZED_DTYPES = ("uint8", "uint16")
+CHUNK_COLUMNS = 64 # table columns converted at a time, bounds temporary memory
+CHUNK_CELLS = 1 << 16 # compact table rows converted at a time
+LUT_MAGIC = b"LIDARLUT"
+LUT_VERSION = 1
+LUT_ALIGNMENT = 4096 # arrays start on page boundaries so they can be memory-mapped
+WRITE_CHUNK_BYTES = 64 << 20 # bytes copied at a time when writing a .lut
+NUM_ANGLES = 360 # one beam per degree
+GENERATOR_VERSION = 1 # bump when the way ranges are simulated changes
+CACHE_DTYPE = "uint16" # cached tables are compact, within 0.001 in of the simulated ranges
+# Beam width in the name of a table written without metadata, e.g. sensor_data_12_ppi_15_beam_angle.pkl
+LEGACY_BEAM_WIDTH = re.compile(r"_(\d+(?:\.\d+)?)_beam_angle")
+
+
+class DenseLookup:
+    """Full [x][y][angle] table of ranges in inches."""
+
+    def __init__(self, table):
+        self.table = table
+
+    @property
+    def shape(self):
+        return self.table.shape
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def lookup(self, x, y, angle):
+        """Ranges in inches for integer cell(s) x, y and angle bin(s), broadcast together."""
+        return np.asarray(self.table[x, y, angle], dtype=float)
+
+    def lookup_scans(self, x, y, angle):
+        """Ranges in inches of whole scans with one flat gather.
+
+        Args:
+            x, y (array-like): Integer cells, shape () or (N,).
+            angle (array-like): Integer angle bins, shape (B,) or (N, B).
+
+        Returns:
+            np.array: Ranges in the table's dtype, shape (B,) or (N, B).
+        """
+        _, height, num_angles = self.table.shape
+        base = (np.asarray(x, dtype=np.intp) * height + y) * num_angles
+        return self.table.reshape(-1).take(base[..., None] + angle)
+
+
+class CompactLookup:
+    """Free-cell-only table with quantized ranges.
+
+    Attributes:
+        cell_index (np.array): (width, height) int32 row of each cell in
+            `ranges`, -1 for cells that are not stored.
+        ranges (np.array): (num_cells, num_angles) uint8 or uint16 ranges.
+        scale (float): Inches per quantization step.
+    """
+
+    def __init__(self, cell_index, ranges, scale):
+        self.cell_index = cell_index
+        self.ranges = ranges
+        self.scale = float(scale)
+
+    @property
+    def shape(self):
+        return self.cell_index.shape + self.ranges.shape[1:]
+
+    @property
+    def nbytes(self):
+        return self.cell_index.nbytes + self.ranges.nbytes
+
+    @classmethod
+    def from_dense(cls, table, dtype="uint8", free_mask=None):
+        """Quantize a dense [x][y][angle] table.
+
+        Args:
+            table (np.array): Dense table, may be a memmap.
+            dtype (str): "uint8" (about 0.19 in steps) or "uint16".
+            free_mask (np.array, optional): (width, height) bool mask of the cells
+                to keep. Defaults to the cells holding any non-zero range, which
+                are exactly the cells the generator visited.
+        """
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"dtype must be one of {QUANTIZED_DTYPES}, got {dtype!r}")
+        width, height, num_angles = table.shape
+        if free_mask is None:
+            free_mask = np.zeros((width, height), dtype=bool)
+            for start in range(0, width, CHUNK_COLUMNS):
+                free_mask[start:start + CHUNK_COLUMNS] = np.any(table[start:start + CHUNK_COLUMNS] != 0, axis=2)
+
+        cell_index = np.full((width, height), -1, dtype=np.int32)
+        cell_index[free_mask] = np.arange(np.count_nonzero(free_mask), dtype=np.int32)
+        scale = MAX_SENSOR_READING / np.iinfo(dtype).max
+        ranges = np.empty((np.count_nonzero(free_mask), num_angles), dtype=dtype)
+
+        row = 0
+        for start in range(0, width, CHUNK_COLUMNS):
+            mask = free_mask[start:start + CHUNK_COLUMNS]
+            cells = np.asarray(table[start:start + CHUNK_COLUMNS])[mask]
+            ranges[row:row + len(cells)] = np.clip(np.rint(cells / scale), 0, np.iinfo(dtype).max)
+            row += len(cells)
+        return cls(cell_index, ranges, scale)
+
+    def lookup(self, x, y, angle):
+        """Ranges in inches for integer cell(s) x, y and angle bin(s), broadcast together."""
+        rows = self.cell_index[x, y]
+        values = self.ranges[np.maximum(rows, 0), angle] * self.scale
+        return np.where(rows >= 0, values, 0.0)
+
+    def lookup_scans(self, x, y, angle):
+        """Ranges in inches of whole scans with one flat gather.
+
+        Args:
+            x, y (array-like): Integer cells, shape () or (N,).
+            angle (array-like): Integer angle bins, shape (B,) or (N, B).
+
+        Returns:
+            np.array: float32 ranges, 0 in cells that are not stored, shape (B,) or (N, B).
+        """
+        rows = self.cell_index[x, y][..., None]
+        values = self.ranges.reshape(-1).take(np.maximum(rows, 0) * self.ranges.shape[1] + angle)
+        return np.where(rows >= 0, values * np.float32(self.scale), np.float32(0))
+
+    def to_dense(self):
+        """Dequantized float32 [x][y][angle] table, 0 in cells that are not stored."""
+        table = np.zeros(self.shape, dtype=np.float32)
+        stored = self.cell_index >= 0
+        table[stored] = self.ranges[self.cell_index[stored]] * self.scale
+        return table
+
+    def save(self, path, metadata=None):
+        extra = {} if metadata is None else {"metadata": json.dumps(metadata)}
+        np.savez(path, cell_index=self.cell_index, ranges=self.ranges, scale=self.scale, **extra)
+
+
+def interpolated_lookup(lookup, x, y, angle):
+    """Ranges at continuous cell coordinates and angles, blending the neighbouring entries.
+
+    Each range is the trilinear blend of the four cells around (x, y) and the
+    two angle bins around `angle`. Neighbouring cells that are not stored
+    (range 0, outside the free space) are left out and the remaining weights
+    renormalized, so a pose next to a wall only blends cells on its side.
+
+    Args:
+        lookup (DenseLookup or CompactLookup): Table indexed [x][y][angle].
+        x, y (array-like): Positions in table cells (pixels at the table's ppi).
+        angle (array-like): Beam angles in bins (degrees for a 360-angle table).
+            All three are broadcast against each other.
+
+    Returns:
+        np.array: Ranges in inches, 0 where no neighbouring cell is stored.
+    """
+    x, y, angle = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float),
+                                      np.asarray(angle, dtype=float))
+    width, height, num_angles = lookup.shape
+    x0, y0, a0 = np.floor(x), np.floor(y), np.floor(angle)
+    fx, fy, fa = x - x0, y - y0, angle - a0
+    x0, y0, a0 = x0.astype(np.intp), y0.astype(np.intp), a0.astype(np.intp)
+
+    total = np.zeros(x.shape)
+    weight_sum = np.zeros(x.shape)
+    for dx, weight_x in ((0, 1 - fx), (1, fx)):
+        cell_x = np.clip(x0 + dx, 0, width - 1)
+        for dy, weight_y in ((0, 1 - fy), (1, fy)):
+            cell_y = np.clip(y0 + dy, 0, height - 1)
+            for da, weight_a in ((0, 1 - fa), (1, fa)):
+                values = lookup.lookup(cell_x, cell_y, (a0 + da) % num_angles)
+                weight = weight_x * weight_y * weight_a * (values > 0)
+                total += weight * values
+                weight_sum += weight
+    return np.where(weight_sum > 0, total / np.maximum(weight_sum, 1e-12), 0.0)
+
+
+class LookupPyramid:
+    """Tables of the same map at several resolutions, for coarse-to-fine scoring.
+
+    Unlike the single tables, lookups take positions in inches, so a caller
+    can read any level whatever resolution it works at.
+
+    Attributes:
+        levels (dict): Pixels per inch -> DenseLookup or CompactLookup,
+            ordered from coarsest to finest.
+    """
+
+    def __init__(self, levels):
+        self.levels = dict(sorted(levels.items()))
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels.values())
+
+    def lookup(self, level_ppi, x, y, angle):
+        """Ranges in inches at positions x, y (inches) and angle bin(s) of one level."""
+        cell_x = np.floor(np.asarray(x) * level_ppi).astype(np.intp)
+        cell_y = np.floor(np.asarray(y) * level_ppi).astype(np.intp)
+        return self.levels[level_ppi].lookup(cell_x, cell_y, angle)
+
+
+def beam_bins(beam_width, num_angles=NUM_ANGLES):
+    """Angle bins covered by a beam `beam_width` degrees wide, rounded up to an odd count so it is centred."""
+    return int(round(beam_width * num_angles / 360)) | 1
+
+
+def cone_ranges(ranges, bins):
+    """Circular sliding-window minimum over the last (angle) axis.
+
+    The minimum over `bins` consecutive angles is built by doubling: after k
+    steps each angle holds the minimum of the next 2**k angles, and two such
+    overlapping spans cover the window. That is O(log bins) array operations.
+
+    Args:
+        ranges (np.array): (..., num_angles) ranges, any dtype.
+        bins (int): Odd window size in angle bins, centred on each angle.
+
+    Returns:
+        np.array: Minimum over angles a - bins // 2 .. a + bins // 2 (wrapping around) for every a.
+    """
+    ranges = np.asarray(ranges)
+    if bins <= 1:
+        return ranges.copy()
+    span, window = 1, ranges
+    while span * 2 <= bins:
+        window = np.minimum(window, np.roll(window, -span, axis=-1))
+        span *= 2
+    half = bins // 2
+    return np.minimum(np.roll(window, half, axis=-1), np.roll(window, half - (bins - span), axis=-1))
+
+
+def cone_table(lookup, beam_width):
+    """Derived table holding, at every angle, the shortest range within a beam `beam_width` degrees wide.
+
+    Args:
+        lookup (DenseLookup or CompactLookup): Single-ray table, may be memory-mapped.
+        beam_width (float): Beam width in degrees, see `beam_bins`.
+
+    Returns:
+        DenseLookup or CompactLookup: The derived table, of the same form.
+    """
+    bins = beam_bins(beam_width, lookup.shape[-1])
+    if isinstance(lookup, CompactLookup):
+        ranges = np.empty(lookup.ranges.shape, dtype=lookup.ranges.dtype)
+        for start in range(0, len(ranges), CHUNK_CELLS):
+            ranges[start:start + CHUNK_CELLS] = cone_ranges(lookup.ranges[start:start + CHUNK_CELLS], bins)
+        return CompactLookup(np.asarray(lookup.cell_index), ranges, lookup.scale)
+    table = np.empty(lookup.shape, dtype=np.float32)
+    for start in range(0, len(table), CHUNK_COLUMNS):
+        table[start:start + CHUNK_COLUMNS] = cone_ranges(lookup.table[start:start + CHUNK_COLUMNS], bins)
+    return DenseLookup(table)
+
+
+def _align(offset):
+    return -(-offset // LUT_ALIGNMENT) * LUT_ALIGNMENT
+
+
+def write_arrays(path, arrays, attrs=None):
+    """Write named arrays to a .lut container.
+
+    Layout: LUT_MAGIC, a little-endian uint32 header length, the JSON header,
+    then each array's raw C-order bytes at a LUT_ALIGNMENT aligned offset.
+
+    Args:
+        path (str or Path): Output file.
+        arrays (dict): Name -> array with at least one dimension (memmaps are
+            copied in chunks).
+        attrs (dict, optional): JSON-serializable attributes stored in the header.
+    """
+    specs = {name: {"dtype": np.dtype(array.dtype).str, "shape": list(array.shape)}
+             for name, array in arrays.items()}
+    header = {"version": LUT_VERSION, "attrs": attrs or {}, "arrays": specs}
+
+    # The data offsets depend on the header length, so lay the arrays out after
+    # a header padded generously enough to hold its own offsets
+    prefix_size = len(LUT_MAGIC) + 4
+    offset = _align(prefix_size + len(json.dumps(header)) + 32 * len(specs) + 64)
+    for name, array in arrays.items():
+        specs[name]["offset"] = offset
+        offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode()
+    data_start = min(spec["offset"] for spec in specs.values()) if specs else prefix_size + len(header_bytes)
+    if prefix_size + len(header_bytes) > data_start:
+        raise ValueError("lookup table header does not fit before the first array")
+
+    with open(path, "wb") as f:
+        f.write(LUT_MAGIC)
+        f.write(np.uint32(len(header_bytes)).astype("<u4").tobytes())
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(specs[name]["offset"])
+            rows = max(1, WRITE_CHUNK_BYTES // max(1, array[:1].nbytes))
+            for start in range(0, len(array), rows):
+                f.write(np.ascontiguousarray(array[start:start + rows]).tobytes())
+
+
+def read_header(path):
+    """Return the JSON header of a .lut container."""
+    with open(path, "rb") as f:
+        if f.read(len(LUT_MAGIC)) != LUT_MAGIC:
+            raise ValueError(f"{path!s} is not a lidar lookup table (.lut) file")
+        (length,) = np.frombuffer(f.read(4), dtype="<u4")
+        return json.loads(f.read(int(length)))
+
+
+def read_arrays(path):
+    """Memory-map every array of a .lut container.
+
+    Returns:
+        tuple: (dict of name -> read-only np.memmap, attrs dict)
+    """
+    header = read_header(path)
+    if header["version"] > LUT_VERSION:
+        raise ValueError(f"{path!s} has format version {header['version']}, newer than {LUT_VERSION}")
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if np.prod(shape) == 0:
+            arrays[name] = np.empty(shape, dtype=spec["dtype"])
+        else:
+            arrays[name] = np.memmap(path, dtype=spec["dtype"], mode="r", offset=spec["offset"], shape=shape)
+    return arrays, header["attrs"]
+
+
+def _table_arrays(lookup, prefix=""):
+    """Arrays and header attributes describing a DenseLookup or CompactLookup."""
+    if isinstance(lookup, CompactLookup):
+        arrays = {prefix + "cell_index": lookup.cell_index, prefix + "ranges": lookup.ranges}
+        return arrays, {"kind": "compact", "scale": lookup.scale}
+    return {prefix + "lidar_lookup": lookup.table}, {"kind": "dense"}
+
+
+def _table_from_arrays(arrays, attrs, prefix=""):
+    if attrs.get("kind") == "compact":
+        return CompactLookup(arrays[prefix + "cell_index"], arrays[prefix + "ranges"], attrs["scale"])
+    return DenseLookup(arrays[prefix + "lidar_lookup"])
+
+
+def save_table(path, lookup, attrs=None):
+    """Save a DenseLookup, CompactLookup or LookupPyramid to a .lut container.
+
+    A pyramid's levels are stored under "<ppi>/" prefixed array names and
+    described by the "levels" header attribute.
+    """
+    attrs = dict(attrs or {})
+    if isinstance(lookup, LookupPyramid):
+        arrays, levels = {}, []
+        for level_ppi, level in lookup.levels.items():
+            level_arrays, level_attrs = _table_arrays(level, f"{level_ppi}/")
+            arrays.update(level_arrays)
+            levels.append(dict(level_attrs, ppi=level_ppi))
+        attrs.update(kind="pyramid", levels=levels)
+    else:
+        arrays, table_attrs = _table_arrays(lookup)
+        attrs.update(table_attrs)
+    write_arrays(path, arrays, attrs)
+
+
+def open_table(path):
+    """Memory-map a table saved by `save_table`; nothing is read up front."""
+    arrays, attrs = read_arrays(path)
+    if attrs.get("kind") == "pyramid":
+        return LookupPyramid({level["ppi"]: _table_from_arrays(arrays, level, f"{level['ppi']}/")
+                              for level in attrs["levels"]})
+    return _table_from_arrays(arrays, attrs)
+
+
+def load_lookup(path):
+    """Load a DenseLookup, CompactLookup or LookupPyramid depending on the file contents.
+
+    .lut files are memory-mapped, .npz and .pkl files are read into memory.
+    """
+    path = Path(path)
+    if path.suffix == ".lut":
+        return open_table(path)
+    if path.suffix == ".pkl":
+        with path.open("rb") as f:
+            return DenseLookup(np.asarray(pickle.load(f), dtype=np.float32))
+    with np.load(path) as f:
+        if "cell_index" in f:
+            return CompactLookup(f["cell_index"], f["ranges"], f["scale"])
+        # adjust key if needed — typically 'lidar_lookup'
+        if "lidar_lookup" in f:
+            return DenseLookup(f["lidar_lookup"])
+        # fallback if it's the only array in the file
+        return DenseLookup(f[list(f.keys())[0]])
+
+
+def load_dense_array(path):
+    """Load any single-resolution table file as a dense [x][y][angle] array."""
+    lookup = load_lookup(path)
+    if isinstance(lookup, LookupPyramid):
+        raise ValueError(f"{path!s} holds a lookup table pyramid, not a single table")
+    return lookup.to_dense() if isinstance(lookup, CompactLookup) else lookup.table
+
+
+def maze_hash(base_grid):
+    """Short digest of the inch-resolution grid from `init_grid`."""
+    grid = np.ascontiguousarray(base_grid, dtype=np.int8)
+    return hashlib.sha256(str(grid.shape).encode() + grid.tobytes()).hexdigest()[:16]
+
+
+def table_metadata(base_grid, ppi, num_angles=NUM_ANGLES, beam_width=1):
+    """Everything a table's ranges depend on, as stored in its header."""
+    return {
+        "maze_hash": maze_hash(base_grid),
+        "grid_shape": list(np.shape(base_grid)),
+        "ppi": ppi,
+        "num_angles": num_angles,
+        "beam_width": beam_width,
+        "sensor_offset": SENSOR_OFFSET,
+        "min_range": MIN_SENSOR_READING,
+        "max_range": MAX_SENSOR_READING,
+        "generator_version": GENERATOR_VERSION,
+    }
+
+
+def read_metadata(path):
+    """Metadata stored with a table file, or None for tables written without it."""
+    path = Path(path)
+    if path.suffix == ".lut":
+        return read_header(path)["attrs"].get("metadata")
+    if path.suffix == ".npz":
+        with np.load(path) as f:
+            if "metadata" in f.files:
+                return json.loads(str(f["metadata"]))
+    return None
+
+
+def _npy_shape(archive, name):
+    """Shape of array `name` in an open .npz archive, read from its header alone."""
+    with archive.open(name + ".npy") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            return np.lib.format.read_array_header_1_0(f)[0]
+        return np.lib.format.read_array_header_2_0(f)[0]
+
+
+def table_shape(path):
+    """[x][y][angle] shape of a single table file without loading its ranges.
+
+    Returns None when only loading the file would tell: pickles and pyramids.
+    """
+    path = Path(path)
+    if path.suffix == ".lut":
+        table = open_table(path)  # memory-mapped, nothing is read
+        return None if isinstance(table, LookupPyramid) else tuple(table.shape)
+    if path.suffix != ".npz":
+        return None
+    with zipfile.ZipFile(path) as archive:
+        # The same array load_lookup would pick
+        names = [name[:-len(".npy")] for name in archive.namelist()]
+        if "cell_index" in names:
+            return _npy_shape(archive, "cell_index") + _npy_shape(archive, "ranges")[1:]
+        return _npy_shape(archive, "lidar_lookup" if "lidar_lookup" in names else names[0])
+
+
+def legacy_beam_width(path):
+    """Beam width in degrees stated by the name of a table without metadata, or None."""
+    match = LEGACY_BEAM_WIDTH.search(Path(path).stem)
+    return float(match.group(1)) if match else None
+
+
+def metadata_mismatches(stored, expected):
+    """Keys of `expected` whose value is different (or missing) in `stored`."""
+    return [key for key, value in expected.items() if stored.get(key) != value]
+
+
+def build_table(base_grid, ppi, num_angles=NUM_ANGLES, dtype=CACHE_DTYPE, beam_width=1):
+    """Simulate a compact table of every free cell with `sweep_ranges`.
+
+    Args:
+        base_grid (np.array): Inch-resolution grid from `init_grid`.
+        ppi (int): Pixels per inch of the table.
+        num_angles (int): Beam angles, evenly spaced over the full turn.
+        dtype (str): Quantized range dtype, see `CompactLookup.from_dense`.
+        beam_width (float): Beam width in degrees, 1 for single rays (see `cone_table`).
+
+    Returns:
+        CompactLookup: The table, indexed like the generator's [x][y][angle].
+    """
+    grid = np.repeat(np.repeat(np.asarray(base_grid), ppi, axis=0), ppi, axis=1)
+    free_mask = (grid == 0).T
+    xs, ys = np.nonzero(free_mask)
+    cell_index = np.full(free_mask.shape, -1, dtype=np.int32)
+    cell_index[free_mask] = np.arange(xs.size, dtype=np.int32)
+
+    scale = MAX_SENSOR_READING / np.iinfo(dtype).max
+    ranges = np.empty((xs.size, num_angles), dtype=dtype)
+    beam_angles = np.arange(num_angles) * (360 / num_angles) * (np.pi / 180)
+    for angle, beam_angle in enumerate(beam_angles):
+        ranges[:, angle] = np.rint(sweep_ranges(grid, xs, ys, beam_angle, ppi) / scale)
+    lookup = CompactLookup(cell_index, ranges, scale)
+    return cone_table(lookup, beam_width) if beam_width > 1 else lookup
+
+
+class LookupTableCache:
+    """Lookup tables built on demand and kept in a directory.
+
+    Each table is named after a digest of its metadata, so a change to the
+    maze or to any parameter selects (and if needed builds) a different file,
+    while an unchanged configuration reuses the table built before.
+
+    Args:
+        directory (str or Path): Where cached tables are stored.
+        base_grid (np.array): Inch-resolution grid from `init_grid`.
+        ppi (int): Pixels per inch of the table.
+        num_angles (int): Beam angles of the table.
+        beam_width (float): Beam width in degrees, 1 for single rays.
+    """
+
+    def __init__(self, directory, base_grid, ppi, num_angles=NUM_ANGLES, beam_width=1):
+        self.directory = Path(directory)
+        self.base_grid = np.asarray(base_grid)
+        self.metadata = table_metadata(base_grid, ppi, num_angles, beam_width)
+
+    @property
+    def path(self):
+        digest = hashlib.sha256(json.dumps(self.metadata, sort_keys=True).encode()).hexdigest()[:12]
+        beam = f"_{self.metadata['beam_width']}deg" if self.metadata["beam_width"] > 1 else ""
+        return self.directory / f"lidar_lookup_{self.metadata['ppi']}ppi{beam}_{digest}.lut"
+
+    def load_or_build(self):
+        """Open the cached table for this configuration, building it first if needed."""
+        path = self.path
+        if path.exists() and not metadata_mismatches(read_metadata(path) or {}, self.metadata):
+            print(f"Loading lidar lookup table {path.name}...")
+            return open_table(path)
+
+        print(f"Building lidar lookup table {path.name} (ppi={self.metadata['ppi']})...")
+        lookup = build_table(self.base_grid, self.metadata["ppi"], self.metadata["num_angles"],
+                             beam_width=self.metadata["beam_width"])
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so an interrupted build is never picked up
+        tmp_path = path.with_name(path.name + ".tmp")
+        save_table(tmp_path, lookup, {"metadata": self.metadata})
+        os.replace(tmp_path, path)
+        return open_table(path)
+
+
+class LookupSensorModel:
+    """Lidar lookup table that is found and loaded on first use.
+
+    Args:
+        candidates (iterable): Table paths in order of preference; the first
+            one that exists (and matches `metadata`) is loaded.
+        metadata (dict, optional): Expected metadata. Tables whose stored
+            metadata differs in any of these keys are skipped. Tables written
+            without metadata are only checked to have the expected shape and
+            beam width; see `legacy_beam_width`.
+        cache (LookupTableCache, optional): Builds the table when no
+            candidate matches.
+        legacy_beam_width (float, optional): Beam width in degrees of the
+            candidates written without metadata whose name does not state
+            one. Without it such tables are skipped.
+
+    A table without metadata whose shape does not fit the grid and ppi is
+    skipped as well, from its header where the format has one, so a
+    mismatch falls back to the cache without loading the table.
+    """
+
+    def __init__(self, candidates, metadata=None, cache=None, legacy_beam_width=None):
+        self.candidates = [Path(path) for path in candidates]
+        self.metadata = metadata
+        self.cache = cache
+        self.legacy_beam_width = legacy_beam_width
+        self._table = None
+
+    @property
+    def loaded(self):
+        return self._table is not None
+
+    def _matches(self, path):
+        stored = read_metadata(path)
+        if self.metadata is None:
+            return True
+        if stored is None:
+            beam_width = legacy_beam_width(path)
+            if beam_width is None:
+                beam_width = self.legacy_beam_width
+            if beam_width is None:
+                print(f"Skipping lidar lookup table {path.name}: no metadata and no beam width in its name")
+                return False
+            expected = self.metadata.get("beam_width", 1)
+            if beam_width != expected:
+                print(f"Skipping lidar lookup table {path.name}: beam_width={beam_width:g} "
+                      f"(expected {expected!r}), table without metadata")
+                return False
+            return self._shape_matches(path, table_shape(path))
+        mismatches = metadata_mismatches(stored, self.metadata)
+        if mismatches:
+            details = ", ".join(f"{key}={stored.get(key)!r} (expected {self.metadata[key]!r})" for key in mismatches)
+            print(f"Skipping lidar lookup table {path.name}: {details}")
+        return not mismatches
+
+    def _shape_matches(self, path, shape):
+        """False (and a note) if `shape` cannot belong to this grid and ppi; None shapes pass."""
+        if shape is None or self.metadata is None or "ppi" not in self.metadata:
+            return True
+        height, width = self.metadata["grid_shape"]
+        ppi = self.metadata["ppi"]
+        expected = (width * ppi, height * ppi, self.metadata["num_angles"])
+        if tuple(shape) != expected:
+            print(f"Skipping lidar lookup table {path.name}: shape {tuple(shape)} (expected {expected} "
+                  f"for ppi={ppi}), built for a different grid or resolution")
+            return False
+        return True
+
+    def _matching_candidates(self):
+        """Candidates that exist and pass every check possible without loading them."""
+        return (path for path in self.candidates if path.exists() and self._matches(path))
+
+    def _fallback(self):
+        if self.cache is None:
+            raise FileNotFoundError(f"Data file not found: {', '.join(str(path) for path in self.candidates)}")
+        return self.cache
+
+    @property
+    def path(self):
+        return next(self._matching_candidates(), None) or self._fallback().path
+
+    @property
+    def table(self):
+        """The DenseLookup, CompactLookup or LookupPyramid, loaded on first access."""
+        if self._table is None:
+            for path in self._matching_candidates():
+                if self.cache is not None and path == self.cache.path:
+                    break
+                print(f"Loading lidar lookup table {path.name}...")
+                table = load_lookup(path)
+                # Pickles only reveal their shape once loaded
+                if isinstance(table, LookupPyramid) or self._shape_matches(path, table.shape):
+                    self._table = table
+                    return table
+            self._table = self._fallback().load_or_build()
+        return self._table
+
+    def warm_up(self):
+        """Load the table now instead of on the first query."""
+        self.table
+        return self
+
+    def lookup(self, x, y, angle):
+        """Ranges in inches for integer cell(s) x, y and angle bin(s), broadcast together."""
+        return self.table.lookup(x, y, angle)
+
+    def lookup_scans(self, x, y, angle):
+        """Ranges in inches of whole scans, see `DenseLookup.lookup_scans`."""
+        return self.table.lookup_scans(x, y, angle)